@@ -9,23 +9,108 @@ import base64
 import io
 import csv
 from pathlib import Path
-from docx.oxml import OxmlElement
+from docx.shared import Length, Twips
 from docx.oxml.ns import qn
 from bs4 import BeautifulSoup, NavigableString
-from collections import Counter
+from collections import Counter, OrderedDict
+from array import array
+import threading
+import concurrent.futures
+import multiprocessing
+import bisect
+import functools
+from streamlit.errors import StreamlitAPIException
 from streamlit_theme import st_theme
 import html
+import zlib
 from datetime import datetime, timezone
+import hashlib
+
+# -----------------------------
+# HTML parsing backend
+# -----------------------------
+def _default_html_parser() -> str:
+    """BeautifulSoup backend for bulk parsing: lxml when installed, else html.parser.
+
+    Set SCRIPTER_HTML_PARSER=html.parser to force the pure-Python reference parser
+    (e.g. to compare highlighting output between the two backends).
+    """
+    requested = os.environ.get("SCRIPTER_HTML_PARSER", "lxml")
+    if requested == "lxml":
+        try:
+            import lxml.html  # noqa: F401
+        except ImportError:
+            return "html.parser"
+    return requested
+
+HTML_PARSER = _default_html_parser()
+
+# C0 control characters (other than tab/newline/CR) that libxml2 rejects or rewrites;
+# markup containing any of them is parsed with html.parser instead.
+_HTML_CONTROL_CHAR_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _parser_for(markup, parser=None) -> str:
+    parser = parser or HTML_PARSER
+    if parser != "html.parser" and _HTML_CONTROL_CHAR_RE.search(markup):
+        return "html.parser"
+    return parser
+
+def parse_html(markup, parser=None):
+    """Parse an HTML fragment into a BeautifulSoup tree with the configured backend.
+
+    lxml wraps fragments in <html><body>; use html_root()/serialize_html() to get
+    at the fragment itself regardless of backend.
+    """
+    markup = markup or ""
+    parser = _parser_for(markup, parser)
+    try:
+        return BeautifulSoup(markup, parser)
+    except ValueError:
+        if parser == "html.parser":
+            raise
+        return BeautifulSoup(markup, "html.parser")
+
+def html_root(soup):
+    """Element whose children are the top-level nodes of a parse_html() fragment."""
+    body = soup.body
+    return body if body is not None else soup
+
+def serialize_html(soup) -> str:
+    """Serialise a parse_html() fragment without any parser-added <html>/<body> wrappers."""
+    return html_root(soup).decode_contents()
+
+def html_to_text(markup, parser=None) -> str:
+    """Visible text of an HTML fragment (what soup.get_text() returns).
+
+    With lxml this bypasses BeautifulSoup entirely; markup without tags or
+    entities is returned as-is.
+    """
+    markup = markup or ""
+    if "<" not in markup and "&" not in markup:
+        return markup
+    parser = _parser_for(markup, parser)
+    if parser == "lxml" and markup.strip():
+        import lxml.html
+        try:
+            return lxml.html.fragment_fromstring(markup, create_parent="div").text_content()
+        except ValueError:
+            parser = "html.parser"
+    return BeautifulSoup(markup, parser).get_text()
 
 
 # -----------------------------
 # PDF export (HTML -> PDF)
 # -----------------------------
-@st.cache_data(show_spinner=False)
+# Whitespace variants DOCX runs use around speaker labels; zero-width spaces are dropped.
+_LABEL_WS_TABLE = str.maketrans({"\u00A0": " ", "\u202F": " ", "\u2009": " ", "\u200A": " ", "\u200B": None})
+_TITLECASE_NAME_RE = re.compile(r"[A-Z][a-z]+")
+
+
 def is_single_titlecase_speaker_label(label_text, next_text=""):
     """True for a single-word Titlecase speaker label followed by ':' and then whitespace.
 
     Handles DOCX run boundaries where the colon/space may be in a separate run with different styling.
+    A plain function (no Streamlit cache) so extraction can run outside the app.
 
     Matches:
       label_text='Pixel'      next_text=': '   -> True
@@ -41,38 +126,20 @@ def is_single_titlecase_speaker_label(label_text, next_text=""):
     if label_text is None:
         return False
 
-    s = str(label_text)
-
-    def norm_ws(x: str) -> str:
-        return (x or "").replace("\u00A0", " ").replace("\u202F", " ").replace("\u2009", " ").replace("\u200A", " ").replace("\u200B", "")
+    s = str(label_text).translate(_LABEL_WS_TABLE)
+    nxt = ("" if next_text is None else str(next_text)).translate(_LABEL_WS_TABLE)
 
-    s = norm_ws(s)
-    nxt = norm_ws("" if next_text is None else str(next_text))
-
-    has_colon_and_ws = (
-        s.endswith(": ") or
-        s.endswith(":\t") or
-        (s.endswith(":") and (nxt[:1].isspace() or nxt.startswith(" ")))
-    )
-
-    has_name_then_colon_ws_in_next = (
-        nxt.startswith(":") and len(nxt) >= 2 and nxt[1].isspace()
-    )
-
-    if has_colon_and_ws:
+    if s.endswith(": ") or s.endswith(":\t") or (s.endswith(":") and nxt[:1].isspace()):
         core = s.rstrip()
         if not core.endswith(":"):
             return False
         name = core[:-1]
-    elif has_name_then_colon_ws_in_next:
+    elif nxt.startswith(":") and len(nxt) >= 2 and nxt[1].isspace():
         name = s.rstrip()
     else:
         return False
 
-    if not re.fullmatch(r"[A-Z][a-z]+", name or ""):
-        return False
-
-    return True
+    return _TITLECASE_NAME_RE.fullmatch(name) is not None
 
 
 def render_html_to_pdf_bytes(html_str: str, base_url: str) -> bytes:
@@ -256,6 +323,12 @@ def build_font_face_css(fontsel: str, embed_base64: bool = False) -> str:
     return "".join(rules)
 
 
+@st.cache_resource(show_spinner=False)
+def app_font_face_css(fontsel: str) -> str:
+    """Base64 @font-face CSS injected on every full rerun; encoded once per font per process."""
+    return build_font_face_css(fontsel, embed_base64=True)
+
+
 def normalize_font_family(fontsel: str) -> str:
     """Normalize UI labels / legacy values to CSS font-family names."""
     return "OpenDyslexic" if fontsel == "Open Dyslexic" else fontsel
@@ -326,75 +399,73 @@ def _fix_mojibake(s: str) -> str:
         s = s.replace(k, v)
     return s
     
-def build_csv_from_docx_json_and_quotes():
+def iter_lines_csv_rows(quotes_lines, docx_path=None, content_type="Book", canonical_map=None):
     """
-    Rebuild the paragraph JSON from the DOCX and use quotes_lines
-    to generate a CSV with Speaker + Line + FileName using the
-    search/trim loop.
+    Rebuild the paragraph list from the DOCX and use quotes_lines
+    to yield the Lines CSV rows (header first, then Speaker + Line + FileName)
+    using the search/trim loop.
+
+    All inputs are passed explicitly (no st.session_state access) so this can
+    run inside a deferred st.download_button callable. Rows are yielded one at
+    a time so the caller can write them straight to disk.
 
     Changes vs previous version:
       - Match on HTML-stripped, mojibake-fixed paragraph text.
       - Skip 'Do Not Read:' lines from quotes.txt.
       - Keep a minimal fallback but avoid duplicate narration
         for unmatched quote segments.
+      - Walk the paragraphs with a (paragraph index, char offset) cursor
+        instead of rebuilding a trimmed copy of the list for every quote.
     """
-    import os, json, re, io, csv
+    import os, re
+
+    quotes_lines = quotes_lines or []
 
     # If we're in Script mode, build the CSV directly from quotes.txt
-    if st.session_state.get("content_type", "Book") == "Script":
-        quotes_lines = st.session_state.get("quotes_lines") or []
-        canonical_map = st.session_state.get("canonical_map") or {}
+    if content_type == "Script":
+        canonical_map = canonical_map or {}
 
         # Parse each quotes.txt line: "123. Speaker: Dialogue"
         pattern = re.compile(r"^\s*([0-9]+(?:[a-zA-Z]+)?)\.\s+([^:]+):\s*(?:[“\"])?(.+?)(?:[”\"])?\s*$")
 
-        rows: list[tuple[str, str]] = []
-
-        for raw_line in quotes_lines:
-            line = raw_line.strip()
-            if not line:
-                continue
-            m = pattern.match(line)
-            if not m:
-                continue
-            _, speaker_raw, quote = m.groups()
-            effective = smart_title(speaker_raw)
-            norm = normalize_speaker_name(effective)
-            canonical = canonical_map.get(norm, effective)
-            text_part = quote.strip()
-            if not text_part:
-                continue
-            rows.append((canonical, text_part))
+        def script_rows():
+            for raw_line in quotes_lines:
+                line = raw_line.strip()
+                if not line:
+                    continue
+                m = pattern.match(line)
+                if not m:
+                    continue
+                _, speaker_raw, quote = m.groups()
+                effective = smart_title(speaker_raw)
+                norm = normalize_speaker_name(effective)
+                canonical = canonical_map.get(norm, effective)
+                text_part = quote.strip()
+                if not text_part:
+                    continue
+                yield canonical, text_part
 
-        # Build CSV: same filename pattern as the book workflow
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(["Speaker", "Line", "FileName"])
+        # Same header and filename pattern as the book workflow
+        yield ["Speaker", "Line", "FileName"]
 
         def normalise_speaker_name_local(s: str) -> str:
             if s and s.strip().lower() == "error":
                 return "Narration"
             return s
 
-        for idx, (speaker, line) in enumerate(rows, start=1):
+        for idx, (speaker, line) in enumerate(script_rows(), start=1):
             speaker_clean = normalise_speaker_name_local(speaker)
             line_clean = normalize_text(line)
             num = f"{idx:05d}"
             safe_speaker = re.sub(r"\s+", "", speaker_clean) or "Narration"
             filename = f"{num}_{safe_speaker}_TakeX"
-            writer.writerow([speaker_clean, line_clean, filename])
-
-        return buf.getvalue().encode("utf-8")
-
-    # Ensure the JSON is up to date for the current DOCX
-    write_paragraph_json_for_session()
-    json_path = st.session_state.get("d_json_path")
-    if not json_path or not os.path.exists(json_path):
-        return b""
+            yield [speaker_clean, line_clean, filename]
+        return
 
-    # --- load and clean paragraph list ---
-    with open(json_path, "r", encoding="utf-8") as f:
-        raw_paragraphs = json.load(f)
+    # Paragraphs straight from the current DOCX (same content as the paragraph JSON)
+    if not docx_path or not os.path.exists(docx_path):
+        return
+    raw_paragraphs = build_d_paragraphs_html(docx_path)
 
     def strip_tags(text: str) -> str:
         # Remove simple HTML-like tags but do NOT normalise whitespace here
@@ -403,100 +474,96 @@ def build_csv_from_docx_json_and_quotes():
     # Plain, mojibake-fixed paragraphs used for all matching and output
     paragraphs_plain = [_fix_mojibake(strip_tags(p)) for p in raw_paragraphs]
 
-    quotes_lines = st.session_state.get("quotes_lines") or []
-
     def normalise_speaker_name(s: str) -> str:
         # We still honour Error->Narration, but do it at the very end as well
         if s and s.strip().lower() == "error":
             return "Narration"
         return s
 
-    rows: list[tuple[str, str]] = []      # (Speaker, Line)
-    remaining = list(paragraphs_plain)    # trimmed as we go (plain text only)
-    unmatched_segments: list[str] = []    # track text we emitted via fallback
+    def book_rows():
+        # Yields (Speaker, Line) pairs in document order
+        para_count = len(paragraphs_plain)
+        cur_idx = 0                           # first paragraph not yet consumed
+        cur_off = 0                           # chars of paragraphs_plain[cur_idx] already consumed
+        unmatched_segments: set[str] = set()  # track text we emitted via fallback
 
-    # =============== CORE LOOP THROUGH QUOTES.TXT ===============
-    for raw_line in quotes_lines:
-        line = raw_line.strip()
-        if not line:
-            continue
+        # =============== CORE LOOP THROUGH QUOTES.TXT ===============
+        for raw_line in quotes_lines:
+            line = raw_line.strip()
+            if not line:
+                continue
 
-        # Remove leading "2621. " style numbering
-        line_wo_num = re.sub(r"^\s*\d+\.\s*", "", line)
+            # Remove leading "2621. " style numbering
+            line_wo_num = re.sub(r"^\s*\d+\.\s*", "", line)
 
-        if ":" not in line_wo_num:
-            continue
+            if ":" not in line_wo_num:
+                continue
 
-        speaker_part, quote_part = line_wo_num.split(":", 1)
-        speaker_raw = speaker_part.strip()
-        quote_text = quote_part.strip()
-        if not quote_text:
-            continue
+            speaker_part, quote_part = line_wo_num.split(":", 1)
+            speaker_raw = speaker_part.strip()
+            quote_text = quote_part.strip()
+            if not quote_text:
+                continue
 
-        # Skip "Do Not Read:" lines entirely
-        if speaker_raw.lower().startswith("do not read"):
-            continue
+            # Skip "Do Not Read:" lines entirely
+            if speaker_raw.lower().startswith("do not read"):
+                continue
 
-        speaker_norm = normalise_speaker_name(speaker_raw)
+            speaker_norm = normalise_speaker_name(speaker_raw)
 
-        # Use mojibake-fixed quote text for matching
-        quote_match = _fix_mojibake(quote_text)
+            # Use mojibake-fixed quote text for matching
+            quote_match = _fix_mojibake(quote_text)
 
-        # ---- FIND QUOTE IN REMAINING PARAGRAPHS (PLAIN TEXT) ----
-        found_idx = -1
-        found_pos = -1
+            # ---- FIND QUOTE FROM THE CURSOR ONWARD (PLAIN TEXT) ----
+            found_idx = -1
+            found_pos = -1
 
-        for idx, para in enumerate(remaining):
-            pos = para.find(quote_match)
-            if pos != -1:
-                found_idx = idx
-                found_pos = pos
-                break
+            for idx in range(cur_idx, para_count):
+                pos = paragraphs_plain[idx].find(quote_match, cur_off if idx == cur_idx else 0)
+                if pos != -1:
+                    found_idx = idx
+                    found_pos = pos
+                    break
 
-        if found_idx == -1:
-            # Fallback: emit the quote from TXT, but remember it so we don't
-            # also emit the same text as Narration later.
-            unmatched_segments.append(quote_match)
-            rows.append((speaker_norm, quote_match))
-            continue
+            if found_idx == -1:
+                # Fallback: emit the quote from TXT, but remember it so we don't
+                # also emit the same text as Narration later.
+                unmatched_segments.add(quote_match)
+                yield speaker_norm, quote_match
+                continue
 
-        # ---- 1. PARAGRAPHS BEFORE MATCH = NARRATION ----
-        before_paras = remaining[:found_idx]
-        for pre in before_paras:
-            plain = pre.strip()
+            # ---- 1. PARAGRAPHS BEFORE MATCH = NARRATION ----
+            for idx in range(cur_idx, found_idx):
+                plain = paragraphs_plain[idx][cur_off if idx == cur_idx else 0:].strip()
+                if plain and plain not in unmatched_segments:
+                    yield "Narration", plain
+
+            # ---- 2. TEXT BEFORE QUOTE IN MATCHING PARAGRAPH ----
+            current = paragraphs_plain[found_idx]
+            before = current[cur_off if found_idx == cur_idx else 0:found_pos]
+            before_plain = before.strip()
+            if before_plain and before_plain not in unmatched_segments:
+                yield "Narration", before_plain
+
+            # ---- 3. THE QUOTE ITSELF ----
+            yield speaker_norm, quote_match
+
+            # ---- 4. ADVANCE CURSOR TO AFTER QUOTE ----
+            cur_idx = found_idx
+            cur_off = found_pos + len(quote_match)
+            if cur_off >= len(current):
+                cur_idx, cur_off = found_idx + 1, 0
+
+        # ---- FINAL TAIL NARRATION ----
+        for idx in range(cur_idx, para_count):
+            plain = paragraphs_plain[idx][cur_off if idx == cur_idx else 0:].strip()
             if plain and plain not in unmatched_segments:
-                rows.append(("Narration", plain))
-
-        # ---- 2. TEXT BEFORE QUOTE IN MATCHING PARAGRAPH ----
-        current = remaining[found_idx]
-        before = current[:found_pos]
-        before_plain = before.strip()
-        if before_plain and before_plain not in unmatched_segments:
-            rows.append(("Narration", before_plain))
-
-        # ---- 3. THE QUOTE ITSELF ----
-        rows.append((speaker_norm, quote_match))
-
-        # ---- 4. TRIM REMAINING TO AFTER QUOTE ----
-        after = current[found_pos + len(quote_match):]
-        new_remaining: list[str] = []
-        if after:
-            new_remaining.append(after)
-        new_remaining.extend(remaining[found_idx + 1:])
-        remaining = new_remaining
-
-    # ---- FINAL TAIL NARRATION ----
-    for tail in remaining:
-        plain = tail.strip()
-        if plain and plain not in unmatched_segments:
-            rows.append(("Narration", plain))
-
-    # =============== BUILD CSV WITH FILENAME COLUMN ===============
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(["Speaker", "Line", "FileName"])
+                yield "Narration", plain
 
-    for idx, (speaker, line) in enumerate(rows, start=1):
+    # =============== EMIT ROWS WITH FILENAME COLUMN ===============
+    yield ["Speaker", "Line", "FileName"]
+
+    for idx, (speaker, line) in enumerate(book_rows(), start=1):
         # Mojibake cleanup at the very end
         speaker_clean = _fix_mojibake(speaker)
         line_clean = _fix_mojibake(line)
@@ -509,15 +576,84 @@ def build_csv_from_docx_json_and_quotes():
         safe_speaker = re.sub(r"\s+", "", speaker_clean) or "Narration"
         filename = f"{num}_{safe_speaker}_TakeX"
 
-        writer.writerow([speaker_clean, line_clean, filename])
+        yield [speaker_clean, line_clean, filename]
+
+
+def write_lines_csv(dest_path, quotes_lines, docx_path=None, content_type="Book", canonical_map=None):
+    """Stream the Lines CSV rows to `dest_path` and return the path.
+
+    Rows are written as they are produced, so memory use does not grow with
+    the length of the book.
+    """
+    import csv
+
+    tmp_path = f"{dest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(iter_lines_csv_rows(quotes_lines, docx_path, content_type, canonical_map))
+    os.replace(tmp_path, dest_path)
+    return dest_path
 
+
+def build_csv_from_docx_json_and_quotes(quotes_lines, docx_path=None, content_type="Book", canonical_map=None):
+    """Return the Lines CSV as bytes (kept for callers that need it in memory)."""
+    import io, csv
+
+    buf = io.StringIO()
+    csv.writer(buf).writerows(iter_lines_csv_rows(quotes_lines, docx_path, content_type, canonical_map))
     return buf.getvalue().encode("utf-8")
 
-def trim_paragraph_cache_before_previous(previous_html: str):
-    # Intentionally disabled in test flow:
-    # destructive cache trimming is unsafe when duplicate paragraphs exist,
-    # because content-equality matching cannot identify the exact prior location.
-    return False
+
+# Parsed paragraph JSON files are shared by every session in the process, keyed by
+# path + mtime + size and evicted least-recently-used once the byte budget is exceeded.
+PARAGRAPH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource(show_spinner=False)
+def _paragraph_cache_store():
+    return {"entries": OrderedDict(), "bytes": 0, "lock": threading.Lock()}
+
+def paragraph_file_key(json_path):
+    """Identify one version of a paragraph JSON file: (abspath, mtime_ns, size)."""
+    st_info = os.stat(json_path)
+    return (os.path.abspath(json_path), st_info.st_mtime_ns, st_info.st_size)
+
+def load_paragraph_cache(json_path):
+    """Return (paragraphs_html, plain_paras) for a paragraph JSON file.
+
+    plain_paras is the tag-stripped text of each paragraph. Both lists are shared
+    between reruns and sessions and must not be mutated; rewriting the file
+    changes its mtime/size and so yields a fresh entry.
+    """
+    key = paragraph_file_key(json_path)
+    store = _paragraph_cache_store()
+    with store["lock"]:
+        hit = store["entries"].get(key)
+        if hit is not None:
+            store["entries"].move_to_end(key)
+            return hit[0], hit[1]
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        paragraphs_html = json.load(f)  # list[str]
+
+    def soup_text(html_s: str) -> str:
+        try:
+            return html_to_text(html_s) or ""
+        except Exception:
+            return html_s
+
+    plain_paras = [soup_text(p) for p in paragraphs_html]
+    # HTML + plain text are roughly twice the file size
+    nbytes = 2 * key[2]
+
+    with store["lock"]:
+        entries = store["entries"]
+        if key not in entries:
+            entries[key] = (paragraphs_html, plain_paras, nbytes)
+            store["bytes"] += nbytes
+        entries.move_to_end(key)
+        while store["bytes"] > PARAGRAPH_CACHE_MAX_BYTES and len(entries) > 1:
+            _, (_, _, evicted) = entries.popitem(last=False)
+            store["bytes"] -= evicted
+    return paragraphs_html, plain_paras
 
 def neutralize_markdown_in_html(html_s: str) -> str:
     try:
@@ -535,9 +671,6 @@ def neutralize_markdown_in_html(html_s: str) -> str:
         # Fallback: raw replacements (may affect tags if present, but better than italics)
         return html_s.replace("*", "&#42;").replace("_", "&#95;")
 
-# Import components for HTML embedding.
-import streamlit.components.v1 as components
-
 def build_d_paragraphs_html(docx_path):
     import docx
     import html
@@ -573,33 +706,45 @@ def build_d_paragraphs_html(docx_path):
 
 
 
-def get_context_for_dialogue_json_only(dialogue: str, occurrence_target: int = 1, start_paragraph_index: int = 0):
-    try:
-        djson_path = st.session_state.get('d_json_path')
-        if not djson_path or not os.path.exists(djson_path):
+def get_context_for_dialogue_json_only(dialogue: str, occurrence_target: int = 1, start_paragraph_index: int = 0, paragraph_data=None):
+    """paragraph_data, when given, is (paragraphs_html, plain_paras, norm_paras) with
+    norm_paras[i] == normalize_text(plain_paras[i], lower=True); bulk callers pass it so
+    the paragraph list is not re-loaded and re-normalised for every quote."""
+    if paragraph_data is not None:
+        paragraphs_html, plain_paras, norm_paras = paragraph_data
+    else:
+        try:
+            djson_path = st.session_state.get('d_json_path')
+            if not djson_path or not os.path.exists(djson_path):
+                return None
+            paragraphs_html, plain_paras = load_paragraph_cache(djson_path)
+        except Exception:
             return None
-        with open(djson_path, "r", encoding="utf-8") as f:
-            paragraphs_html = json.load(f)  # list[str]
-    except Exception:
+        norm_paras = None
+
+    resolved = resolve_context_paragraph(dialogue, occurrence_target, start_paragraph_index, plain_paras, norm_paras)
+    if resolved is None:
         return None
+    return build_context_for_paragraph(paragraphs_html, *resolved)
 
-    def soup_text(html_s: str) -> str:
-        try:
-            soup = BeautifulSoup(html_s, "html.parser")
-            return soup.get_text() or ""
-        except Exception:
-            return html_s
+
+def resolve_context_paragraph(dialogue: str, occurrence_target: int, start_paragraph_index: int, plain_paras, norm_paras=None):
+    """Locate the paragraph holding the occurrence_target-th match of the dialogue,
+    scanning from start_paragraph_index. Returns (chosen_idx, dialogue_to_highlight,
+    normalized_highlight, within_para_target), or None when nothing matches."""
+    def para_norm_at(idx: int) -> str:
+        if norm_paras is not None:
+            return norm_paras[idx]
+        return normalize_text(plain_paras[idx], lower=True)
 
     dlg = dialogue
     m_q = re.search(r'[“"]([^”"]+)[”"]', dlg) or re.search(r"[‘']([^’']+)[’']", dlg)
     dialogue_to_highlight = m_q.group(1) if m_q else dlg
-    normalized_highlight = normalize_text(dialogue_to_highlight).lower()
+    normalized_highlight = normalize_text(dialogue_to_highlight, lower=True)
 
     if not normalized_highlight.strip():
         occurrence_target = 1
 
-    plain_paras = [soup_text(p) for p in paragraphs_html]
-
     try:
         start_idx = max(0, int(start_paragraph_index or 0))
     except Exception:
@@ -612,8 +757,7 @@ def get_context_for_dialogue_json_only(dialogue: str, occurrence_target: int = 1
     within_para_target = 1
 
     for idx in range(start_idx, len(plain_paras)):
-        para_plain = plain_paras[idx]
-        para_norm = normalize_text(para_plain).lower()
+        para_norm = para_norm_at(idx)
         count_here = count_with_boundaries_ci(para_norm, normalized_highlight) if normalized_highlight else 0
         if count_here > 0:
             if cumulative + count_here >= occurrence_target:
@@ -624,8 +768,7 @@ def get_context_for_dialogue_json_only(dialogue: str, occurrence_target: int = 1
 
     if chosen_idx is None:
         for idx in range(start_idx, len(plain_paras)):
-            para_plain = plain_paras[idx]
-            if find_with_boundaries_ci(normalize_text(para_plain).lower(), normalized_highlight, 0) is not None:
+            if find_with_boundaries_ci(para_norm_at(idx), normalized_highlight, 0) is not None:
                 chosen_idx = idx
                 within_para_target = 1
                 break
@@ -633,6 +776,12 @@ def get_context_for_dialogue_json_only(dialogue: str, occurrence_target: int = 1
     if chosen_idx is None:
         return None
 
+    return chosen_idx, dialogue_to_highlight, normalized_highlight, within_para_target
+
+
+def build_context_for_paragraph(paragraphs_html, chosen_idx: int, dialogue_to_highlight: str, normalized_highlight: str, within_para_target: int):
+    """Render the context dict (previous/current/next HTML) for a resolved paragraph,
+    bolding the within_para_target-th match of the dialogue in the current paragraph."""
     ctx = {}
     ctx["paragraph_index"] = chosen_idx
     if chosen_idx > 0:
@@ -812,10 +961,127 @@ def write_paragraph_json_for_session():
         with open(json_path, "w", encoding="utf-8") as f:
             json.dump(paragraphs, f, ensure_ascii=False, indent=2)
         st.session_state['d_json_path'] = json_path
+        clear_step2_prefetch()
     except Exception:
         # Do not silently recreate elsewhere; leave preview blank if this fails.
         pass
 
+def bump_state_version(name):
+    """Record that session state `name` changed; memoized Step 4 renders/exports built from it go stale."""
+    versions = st.session_state.setdefault("state_versions", {})
+    versions[name] = versions.get(name, 0) + 1
+
+def state_version(*names):
+    versions = st.session_state.get("state_versions") or {}
+    return tuple(versions.get(n, 0) for n in names)
+
+def set_tracked_state(key, value):
+    """Assign st.session_state[key], bumping its version only when the value actually changed."""
+    if key not in st.session_state or st.session_state[key] != value:
+        bump_state_version(key)
+    st.session_state[key] = value
+
+def lazy_artifact(name, version, build):
+    """Return a zero-argument callable for st.download_button(data=...).
+
+    The artefact is only built when the user clicks download, and the result is
+    memoized until `version` changes. The memo is a plain dict held in session
+    state; `build` must not call Streamlit APIs because deferred downloads run
+    outside the script thread.
+    """
+    cache = st.session_state.setdefault("artifact_cache", {})
+
+    def produce():
+        hit = cache.get(name)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        data = build()
+        cache[name] = (version, data)
+        return data
+
+    return produce
+
+# Step 2 shows one quote at a time; while the user reads it, the contexts for the
+# next few Unknown lines are computed on a background thread. Entries are keyed by
+# everything the lookup depends on, so a wrong guess is just a miss.
+STEP2_PREFETCH_AHEAD = 3
+STEP2_PREFETCH_MAX_ENTRIES = 32
+
+def get_step2_prefetch_cache():
+    """Per-session prefetch cache: an LRU of entries plus the lock the worker shares."""
+    cache = st.session_state.get("step2_prefetch")
+    if cache is None:
+        cache = {"lock": threading.Lock(), "entries": OrderedDict(), "generation": 0}
+        st.session_state.step2_prefetch = cache
+    return cache
+
+def step2_prefetch_get(key):
+    cache = get_step2_prefetch_cache()
+    with cache["lock"]:
+        hit = cache["entries"].get(key)
+        if hit is not None:
+            cache["entries"].move_to_end(key)
+        return hit
+
+def _step2_prefetch_put(cache, key, value, generation=None):
+    with cache["lock"]:
+        if generation is not None and generation != cache["generation"]:
+            return
+        cache["entries"][key] = value
+        cache["entries"].move_to_end(key)
+        while len(cache["entries"]) > STEP2_PREFETCH_MAX_ENTRIES:
+            cache["entries"].popitem(last=False)
+
+def step2_prefetch_put(key, value):
+    _step2_prefetch_put(get_step2_prefetch_cache(), key, value)
+
+def clear_step2_prefetch():
+    """Drop prefetched contexts and orphan any running worker (e.g. after undo)."""
+    cache = get_step2_prefetch_cache()
+    with cache["lock"]:
+        cache["entries"].clear()
+        cache["generation"] += 1
+
+def start_step2_prefetch(jobs):
+    """Compute (key, build) jobs in order on a daemon thread, superseding any earlier run.
+
+    `build` runs outside the script thread, so like lazy_artifact builders it must
+    not call Streamlit APIs; it returns the entry to cache (or None to skip).
+    """
+    if not jobs:
+        return
+    cache = get_step2_prefetch_cache()
+    with cache["lock"]:
+        cache["generation"] += 1
+        generation = cache["generation"]
+
+    def run():
+        for key, build in jobs:
+            with cache["lock"]:
+                if generation != cache["generation"]:
+                    return
+                if key in cache["entries"]:
+                    continue
+            try:
+                value = build()
+            except Exception:
+                continue
+            if value is not None:
+                _step2_prefetch_put(cache, key, value, generation)
+
+    threading.Thread(target=run, name="step2-prefetch", daemon=True).start()
+
+def neutralized_context_blocks(context):
+    """The previous/current/next HTML of a context, ready for st.markdown."""
+    return [neutralize_markdown_in_html(context[k]) for k in ("previous", "current", "next") if context.get(k)]
+
+def rerun_step2_panel():
+    """Rerun only the Step 2 panel fragment; a full rerun if the panel is running as part of one."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
 #def ensure_d_json(docx_path, quotes_path):
 #    """Deprecated: use write_paragraph_json_for_session(). Keeping for backward compatibility."""
 #    write_paragraph_json_for_session()
@@ -836,7 +1102,7 @@ st.session_state.fontsel = fontsel
 
 # Apply the selected font globally across the full app, including start page.
 # For custom bundled fonts, use Base64 so Streamlit can load fonts reliably.
-font_face_css = build_font_face_css(fontsel, embed_base64=True)
+font_face_css = app_font_face_css(fontsel)
 # Inject custom CSS
 custom_css = f"""
 <style>
@@ -1024,7 +1290,7 @@ if st.session_state.step == 0:
         index=0 if st.session_state.get("content_type", "Book") == "Book" else 1,
         horizontal=True,
     )
-    st.session_state.content_type = content_type
+    set_tracked_state("content_type", content_type)
 
     # Existing user key input
     user_input = st.text_input(
@@ -1050,13 +1316,55 @@ def get_progress_file():
 def get_unmatched_quotes_filename():
     return f"{st.session_state.userkey}-unmatched_quotes.txt"
 
-def normalize_text(text):
-    text = text.replace("\u00A0", " ")
-    text = text.replace("…", "...")
-    text = text.replace("“", "\"").replace("”", "\"")
-    text = text.replace("’", "'").replace("‘", "'")
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+def get_lines_csv_filename():
+    return f"{st.session_state.userkey}-lines.csv"
+
+# Typographic characters folded to ASCII before matching. All are one-for-one, so
+# folding keeps character offsets; "…" (expanded to "...") is handled separately.
+_TYPOGRAPHY_FOLDS = (("\u00A0", " "), ("“", "\""), ("”", "\""), ("’", "'"), ("‘", "'"))
+
+
+def _fold_typography(text: str) -> str:
+    # Chained str.replace beats str.translate with a dict table here (CPython's
+    # translate fast path only covers ASCII-to-ASCII tables).
+    for src, dst in _TYPOGRAPHY_FOLDS:
+        text = text.replace(src, dst)
+    return text
+
+
+# Normalised strings are shared by every session in the process and survive reruns;
+# the script body (and so any module-level lru_cache) is re-executed on each rerun.
+NORMALIZE_TEXT_MEMO_MAX_ENTRIES = 16384
+
+@st.cache_resource(show_spinner=False)
+def _normalize_text_store():
+    return {"entries": OrderedDict(), "lock": threading.Lock()}
+
+# Resolved here so the Step 2 prefetch worker never calls into Streamlit.
+_NORMALIZE_TEXT_MEMO = _normalize_text_store()
+
+def normalize_text(text, lower=False):
+    """Fold typographic quotes/ellipsis/NBSP to ASCII, collapse whitespace and strip.
+
+    Results are memoised in a bounded LRU held by st.cache_resource; lower=True
+    also lowercases, cached alongside.
+    """
+    key = (text, lower)
+    memo = _NORMALIZE_TEXT_MEMO
+    with memo["lock"]:
+        hit = memo["entries"].get(key)
+        if hit is not None:
+            memo["entries"].move_to_end(key)
+            return hit
+    result = " ".join(_fold_typography(text).replace("…", "...").split())
+    if lower:
+        result = result.lower()
+    with memo["lock"]:
+        entries = memo["entries"]
+        entries[key] = result
+        if len(entries) > NORMALIZE_TEXT_MEMO_MAX_ENTRIES:
+            entries.popitem(last=False)
+    return result
 
 def match_normalize(text):
     return text.replace("’", "'").replace("‘", "'")
@@ -1114,47 +1422,48 @@ def nth_span_with_boundaries_ci(haystack: str, needle: str, target: int):
         start = pos + len(needle)
 
 
+# Whitespace that normalize_text rewrites: runs of two or more, or any single
+# whitespace character other than a plain space.
+_IRREGULAR_WS_RE = re.compile(r"\s{2,}|[^\S ]")
+
+
 def normalize_text_with_index_map(text: str):
-    """Normalize text while preserving a normalized-char -> raw-index map."""
+    """Normalize like normalize_text, also returning an array('I') that maps each
+    normalized character to its index in the raw text."""
     raw = str(text or "")
-    out_chars = []
-    out_map = []
-    prev_space = True
-
-    def emit(chars: str, raw_index: int):
-        nonlocal prev_space
-        for c in chars:
-            if c.isspace():
-                if prev_space:
-                    continue
-                out_chars.append(" ")
-                out_map.append(raw_index)
-                prev_space = True
-            else:
-                out_chars.append(c)
-                out_map.append(raw_index)
-                prev_space = False
-
-    for i, ch in enumerate(raw):
-        if ch == "\u00A0":
-            emit(" ", i)
-        elif ch == "…":
-            emit("...", i)
-        elif ch in ("“", "”"):
-            emit('"', i)
-        elif ch in ("’", "‘"):
-            emit("'", i)
-        else:
-            emit(ch, i)
+    folded = _fold_typography(raw)
+    if "…" not in folded:
+        base = None  # identity: every character is still at its raw offset
+    else:
+        # "…" expands to three dots that all map back to it.
+        base = array("I")
+        pos = 0
+        idx = folded.find("…")
+        while idx != -1:
+            base.extend(range(pos, idx))
+            base.extend((idx, idx, idx))
+            pos = idx + 1
+            idx = folded.find("…", pos)
+        base.extend(range(pos, len(folded)))
+        folded = folded.replace("…", "...")
+
+    # Single spaces stay as they are, so only irregular runs break the copied ranges.
+    pieces = []
+    index_map = array("I")
+    pos = 0
+    for m in _IRREGULAR_WS_RE.finditer(folded):
+        ws = m.start()
+        pieces.append(folded[pos:ws])
+        pieces.append(" ")
+        index_map.extend(range(pos, ws + 1) if base is None else base[pos:ws + 1])
+        pos = m.end()
+    pieces.append(folded[pos:])
+    index_map.extend(range(pos, len(folded)) if base is None else base[pos:])
 
-    # strip leading/trailing spaces in normalized text (to mirror normalize_text)
-    start = 0
-    end = len(out_chars)
-    while start < end and out_chars[start] == " ":
-        start += 1
-    while end > start and out_chars[end - 1] == " ":
-        end -= 1
-    return "".join(out_chars[start:end]), out_map[start:end]
+    normalized = "".join(pieces)
+    start = 1 if normalized.startswith(" ") else 0
+    end = len(normalized) - 1 if len(normalized) > start and normalized.endswith(" ") else len(normalized)
+    return normalized[start:end], index_map[start:end]
 
 
 def extract_first_quoted_segment(text: str) -> str:
@@ -1168,23 +1477,25 @@ def extract_first_quoted_segment(text: str) -> str:
     return m.group(1) if m else s
 
 
+def record_dialogue_norm(record: dict) -> str:
+    """Normalized first quoted segment of a record, as used for occurrence counting."""
+    rec = record or {}
+    text = (rec.get("quote_with_marks") or rec.get("quote_text") or "").strip()
+    return normalize_text(extract_first_quoted_segment(text), lower=True)
+
+
 def compute_occurrence_target_for_review(quotes_records: list[dict], review_index: int) -> int:
     """Count how many earlier quote records carry the same normalized dialogue segment."""
     if not quotes_records or review_index is None or review_index < 0 or review_index >= len(quotes_records):
         return 1
 
-    current = quotes_records[review_index] or {}
-    current_text = (current.get("quote_with_marks") or current.get("quote_text") or "").strip()
-    current_norm = normalize_text(extract_first_quoted_segment(current_text)).lower()
+    current_norm = record_dialogue_norm(quotes_records[review_index])
     if not current_norm:
         return 1
 
     prior_same = 0
     for i in range(review_index):
-        rec = quotes_records[i] or {}
-        prior_text = (rec.get("quote_with_marks") or rec.get("quote_text") or "").strip()
-        prior_norm = normalize_text(extract_first_quoted_segment(prior_text)).lower()
-        if prior_norm == current_norm:
+        if record_dialogue_norm(quotes_records[i]) == current_norm:
             prior_same += 1
 
     return 1 + prior_same
@@ -1204,50 +1515,177 @@ def compute_start_paragraph_index_for_review(quotes_records: list[dict], review_
     return last_seen
 
 
-def populate_record_context_fields(record: dict, context: dict, occurrence_target: int):
-    """Write context lookup outputs into a quote record using the standard schema."""
+def populate_record_context_fields(record: dict, resolved, occurrence_target: int):
+    """Write a context lookup (a resolve_context_paragraph result, or None) into a quote record.
+
+    Only the paragraph index and which match inside that paragraph is the quote are
+    stored; the context HTML/text is rebuilt on demand by get_record_context.
+    """
     record["occurrence_target"] = occurrence_target
-    record["paragraph_index"] = context.get("paragraph_index") if context else record.get("paragraph_index")
-    record["context_previous_html"] = context.get("previous") if context else None
-    record["context_current_html"] = context.get("current") if context else None
-    record["context_next_html"] = context.get("next") if context else None
-    record["context_previous_text"] = BeautifulSoup(context["previous"], "html.parser").get_text() if context and context.get("previous") else None
-    record["context_current_text"] = BeautifulSoup(context["current"], "html.parser").get_text() if context and context.get("current") else None
-    record["context_next_text"] = BeautifulSoup(context["next"], "html.parser").get_text() if context and context.get("next") else None
+    if resolved is not None:
+        record["paragraph_index"] = resolved[0]
+        record["paragraph_match_occurrence"] = resolved[3]
+    else:
+        record["paragraph_match_occurrence"] = None
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _render_record_context(paragraph_key, paragraph_index: int, dialogue: str, match_occurrence: int, _paragraphs_html, _plain_paras):
+    """Cached body of get_record_context; paragraph_key identifies the paragraph JSON version."""
+    dialogue_to_highlight = extract_first_quoted_segment(dialogue)
+    normalized_highlight = normalize_text(dialogue_to_highlight, lower=True)
+    ctx = build_context_for_paragraph(
+        _paragraphs_html, paragraph_index, dialogue_to_highlight, normalized_highlight, match_occurrence
+    )
+    ctx["previous_text"] = _plain_paras[paragraph_index - 1] if "previous" in ctx else None
+    ctx["current_text"] = html_to_text(ctx["current"]) if ctx.get("current") else None
+    ctx["next_text"] = _plain_paras[paragraph_index + 1] if "next" in ctx else None
+    return ctx
+
+
+def get_record_context(record: dict):
+    """Context for a quote record, rendered from the session's paragraph JSON.
+
+    Returns the get_context_for_dialogue_json_only dict plus previous_text /
+    current_text / next_text, or None if the record has no resolved paragraph.
+    """
+    rec = record or {}
+    pidx = rec.get("paragraph_index")
+    match_occurrence = rec.get("paragraph_match_occurrence")
+    if not isinstance(pidx, int) or not isinstance(match_occurrence, int) or pidx < 0:
+        return None
+    try:
+        djson_path = st.session_state.get('d_json_path')
+        if not djson_path or not os.path.exists(djson_path):
+            return None
+        paragraph_key = paragraph_file_key(djson_path)
+        paragraphs_html, plain_paras = load_paragraph_cache(djson_path)
+    except Exception:
+        return None
+    if pidx >= len(paragraphs_html):
+        return None
+    dialogue = (rec.get("quote_with_marks") or rec.get("quote_text") or "").strip()
+    return _render_record_context(paragraph_key, pidx, dialogue, match_occurrence, paragraphs_html, plain_paras)
+
+
+def resolve_record_paragraph(dialogue: str, occurrence_target: int, start_paragraph_index: int, plain_paras, norm_paras):
+    """resolve_context_paragraph from the forward cursor, retrying from the beginning
+    on a miss so one bad alignment does not cascade and null out the rest."""
+    resolved = resolve_context_paragraph(dialogue, occurrence_target, start_paragraph_index, plain_paras, norm_paras)
+    if resolved is None and start_paragraph_index > 0:
+        resolved = resolve_context_paragraph(dialogue, occurrence_target, 0, plain_paras, norm_paras)
+    return resolved
+
+
+# Bulk auto-populate fans the paragraph search out over a process pool once there are
+# enough records to amortise the fork; smaller batches stay in-process.
+CONTEXT_POOL_MIN_RECORDS = 200
+CONTEXT_POOL_MAX_WORKERS = 8
+
+# Set in the parent just before forking so workers inherit the paragraph lists and
+# lookups instead of having them pickled with every task.
+_context_pool_state = None
+
+
+def _context_pool_resolve_chunk(bounds):
+    """Pool worker: resolve records [lo, hi) in sequence, guessing a cursor of 0 for
+    the first one. Returns [(start_paragraph_index, resolved), ...]."""
+    plain_paras, norm_paras, lookups = _context_pool_state
+    lo, hi = bounds
+    out = []
+    cursor = 0
+    for dialogue, occurrence_target in lookups[lo:hi]:
+        resolved = resolve_record_paragraph(dialogue, occurrence_target, cursor, plain_paras, norm_paras)
+        out.append((cursor, resolved))
+        if resolved is not None:
+            cursor = resolved[0]
+    return out
+
+
+def resolve_record_paragraphs(lookups: list, plain_paras, norm_paras) -> list:
+    """Resolve [(dialogue, occurrence_target), ...] with a forward cursor, returning
+    one resolve_record_paragraph result per lookup, in order.
+
+    Large batches are split into contiguous chunks that a fork-based process pool
+    resolves speculatively, each from a guessed cursor. The merge walks the results in
+    order with the true cursor: a lookup computed from that same cursor is taken as is
+    and any other is redone in-process. Each chunk converges with the real cursor at
+    its first unambiguous quote, so the result is the same as the sequential sweep.
+    Single-CPU hosts, platforms without fork and any pool failure stay in-process.
+    """
+    global _context_pool_state
+    speculative = None
+    workers = min(os.cpu_count() or 1, CONTEXT_POOL_MAX_WORKERS)
+    if len(lookups) >= CONTEXT_POOL_MIN_RECORDS and workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        n_chunks = workers * 2
+        size = -(-len(lookups) // n_chunks)
+        bounds = [(lo, min(lo + size, len(lookups))) for lo in range(0, len(lookups), size)]
+        _context_pool_state = (plain_paras, norm_paras, lookups)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+            ) as pool:
+                speculative = [item for chunk in pool.map(_context_pool_resolve_chunk, bounds) for item in chunk]
+        except Exception:
+            speculative = None
+        finally:
+            _context_pool_state = None
+
+    results = []
+    cursor = 0
+    for i, (dialogue, occurrence_target) in enumerate(lookups):
+        if speculative is not None and speculative[i][0] == cursor:
+            resolved = speculative[i][1]
+        else:
+            resolved = resolve_record_paragraph(dialogue, occurrence_target, cursor, plain_paras, norm_paras)
+        results.append(resolved)
+        if resolved is not None:
+            cursor = resolved[0]
+    return results
 
 
 def autopopulate_context_for_all_records(quotes_records: list[dict]):
-    """Populate paragraph/context fields for every quote record in sequence."""
+    """Populate paragraph/context fields for every quote record.
+
+    Occurrence targets come from a running count per normalized dialogue segment,
+    the paragraph list is loaded and normalised once, and the paragraph search runs
+    through resolve_record_paragraphs. Context HTML is not rendered here; see
+    get_record_context.
+    """
     if not quotes_records:
         return {"updated": 0, "with_context": 0, "without_context": 0}
 
-    with_context = 0
-    without_context = 0
-    search_start_paragraph_index = 0
-    for i, rec in enumerate(quotes_records):
+    plain_paras = norm_paras = None
+    try:
+        djson_path = st.session_state.get('d_json_path')
+        if djson_path and os.path.exists(djson_path):
+            _, plain_paras = load_paragraph_cache(djson_path)
+            norm_paras = [normalize_text(p, lower=True) for p in plain_paras]
+    except Exception:
+        plain_paras = norm_paras = None
+
+    lookups = []
+    seen_counts: dict[str, int] = {}
+    for rec in quotes_records:
         rec = rec or {}
         dialogue = (rec.get("quote_with_marks") or rec.get("quote_text") or "").strip()
-        occurrence_target = compute_occurrence_target_for_review(quotes_records, i)
-        start_paragraph_index = search_start_paragraph_index
-        context = get_context_for_dialogue_json_only(
-            dialogue,
-            occurrence_target=occurrence_target,
-            start_paragraph_index=start_paragraph_index,
-        )
-        # If the forward-only start index misses (e.g., one bad alignment), retry from
-        # the beginning so one failure does not cascade and null out the rest.
-        if context is None and start_paragraph_index > 0:
-            context = get_context_for_dialogue_json_only(
-                dialogue,
-                occurrence_target=occurrence_target,
-                start_paragraph_index=0,
-            )
-        populate_record_context_fields(rec, context, occurrence_target)
-        if context:
+        dialogue_norm = record_dialogue_norm(rec)
+        occurrence_target = 1 + seen_counts.get(dialogue_norm, 0) if dialogue_norm else 1
+        seen_counts[dialogue_norm] = seen_counts.get(dialogue_norm, 0) + 1
+        lookups.append((dialogue, occurrence_target))
+
+    if plain_paras is not None:
+        resolved_list = resolve_record_paragraphs(lookups, plain_paras, norm_paras)
+    else:
+        resolved_list = [None] * len(lookups)
+
+    with_context = 0
+    without_context = 0
+    for rec, (_, occurrence_target), resolved in zip(quotes_records, lookups, resolved_list):
+        populate_record_context_fields(rec or {}, resolved, occurrence_target)
+        if resolved is not None:
             with_context += 1
-            pidx = context.get("paragraph_index")
-            if isinstance(pidx, int) and pidx >= 0:
-                search_start_paragraph_index = pidx
         else:
             without_context += 1
 
@@ -1274,6 +1712,78 @@ def smart_title(name):
     return result
 
 
+# ---------------------------
+# Speaker statistics
+# ---------------------------
+# Per-speaker line counts and first appearance for the current quotes_lines, built in
+# one pass and then kept current line by line (set_quotes_line / sync), so no step
+# transition has to rescan the book. Speakers are keyed by normalize_speaker_name.
+SPEAKER_FLAG_THRESHOLD = 10
+_QUOTE_SPEAKER_RE = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
+
+def quote_line_speaker(line):
+    """(normalized name, display name) of a quotes line's speaker, or None."""
+    m = _QUOTE_SPEAKER_RE.match(line.strip())
+    if not m:
+        return None
+    display = smart_title(m.group(1).strip())
+    return normalize_speaker_name(display), display
+
+def build_speaker_stats(quotes_lines):
+    speakers = [quote_line_speaker(line) for line in quotes_lines]
+    counts = Counter()
+    first = {}
+    for i, sp in enumerate(speakers):
+        if sp is not None:
+            counts[sp[0]] += 1
+            first.setdefault(sp[0], i)
+    return {"speakers": speakers, "counts": counts, "first": first}
+
+def get_speaker_stats():
+    """Speaker statistics for st.session_state.quotes_lines, rebuilt only when the
+    lines were replaced rather than edited through the stats."""
+    lines = st.session_state.get("quotes_lines") or []
+    version = state_version("quotes_lines")
+    stats = st.session_state.get("speaker_stats")
+    if stats is None or stats["version"] != version or len(stats["speakers"]) != len(lines):
+        stats = build_speaker_stats(lines)
+        stats["version"] = version
+        st.session_state.speaker_stats = stats
+    return stats
+
+def update_speaker_stats(stats, changes):
+    """Apply (index, new_line) edits to `stats`; call after bumping quotes_lines."""
+    speakers, counts, first = stats["speakers"], stats["counts"], stats["first"]
+    for index, line in changes:
+        old, new = speakers[index], quote_line_speaker(line)
+        if old == new:
+            continue
+        speakers[index] = new
+        stats.pop("registry", None)
+        if old is not None:
+            norm = old[0]
+            counts[norm] -= 1
+            if not counts[norm]:
+                del counts[norm]
+                del first[norm]
+            elif first[norm] == index:
+                first[norm] = next(i for i in range(index + 1, len(speakers)) if speakers[i] and speakers[i][0] == norm)
+        if new is not None:
+            norm = new[0]
+            counts[norm] += 1
+            if first.get(norm, index) >= index:
+                first[norm] = index
+    stats["version"] = state_version("quotes_lines")
+
+def speaker_display_name(stats, norm):
+    """The speaker as first written in the quotes."""
+    return stats["speakers"][stats["first"][norm]][1]
+
+def frequent_speakers(stats):
+    """Speakers with at least SPEAKER_FLAG_THRESHOLD lines, alphabetically by normalized name."""
+    return sorted(n for n, c in stats["counts"].items() if c >= SPEAKER_FLAG_THRESHOLD and n != "unknown")
+
+
 QUOTE_LINE_PATTERN = re.compile(r"^\s*(\d+(?:[a-zA-Z]+)?)\.\s+([^:]+):\s*(.*)$")
 
 
@@ -1298,9 +1808,66 @@ def parse_quote_line(raw_line: str):
     }
 
 
+# Bump when the quote record layout changes; normalize_record_schema upgrades any
+# record that carries an older (or no) version and passes current ones through.
+# Unversioned records (version 1) still carried the context_* copies.
+QUOTE_RECORD_SCHEMA_VERSION = 2
+
+# Per-record context copies written by older versions; dropped on load.
+LEGACY_CONTEXT_FIELDS = (
+    "context_previous_html",
+    "context_current_html",
+    "context_next_html",
+    "context_previous_text",
+    "context_current_text",
+    "context_next_text",
+)
+
+
+# Accepted types for each field of a current record. Records validated on load have
+# any other value reset to the make_quote_record default.
+QUOTE_RECORD_FIELD_TYPES = {
+    "quote_id": str,
+    "index": int,
+    "index_raw": str,
+    "speaker_text": str,
+    "quote_text": str,
+    "quote_with_marks": str,
+    "review_status": str,
+    "predicted_speaker": (str, type(None)),
+    "prediction_confidence": (int, float, type(None)),
+    "candidate_speakers": list,
+    "candidate_scores": dict,
+    "model_version": (str, type(None)),
+    "content_type": str,
+    "paragraph_index": (int, type(None)),
+    "occurrence_target": (int, type(None)),
+    "paragraph_match_occurrence": (int, type(None)),
+    "notes": str,
+    "manual_override": bool,
+}
+
+# Fields make_quote_record fills with a fixed default. The progress file leaves them
+# out while they still hold it (see compact_quote_record); loading restores them.
+QUOTE_RECORD_FIXED_DEFAULTS = {
+    "review_status": "unreviewed",
+    "predicted_speaker": None,
+    "prediction_confidence": None,
+    "candidate_speakers": [],
+    "candidate_scores": {},
+    "model_version": None,
+    "paragraph_index": None,
+    "occurrence_target": None,
+    "paragraph_match_occurrence": None,
+    "notes": "",
+    "manual_override": False,
+}
+
+
 def make_quote_record(index: int, speaker_text: str, quote_text: str, quote_with_marks: str = None, content_type: str = None, index_raw: str = None):
     idx_raw = str(index_raw if index_raw is not None else index)
     return {
+        "schema_version": QUOTE_RECORD_SCHEMA_VERSION,
         "quote_id": f"q{index:05d}",
         "index": int(index),
         "index_raw": idx_raw,
@@ -1316,18 +1883,26 @@ def make_quote_record(index: int, speaker_text: str, quote_text: str, quote_with
         "content_type": content_type or st.session_state.get("content_type", "Book"),
         "paragraph_index": None,
         "occurrence_target": None,
-        "context_previous_html": None,
-        "context_current_html": None,
-        "context_next_html": None,
-        "context_previous_text": None,
-        "context_current_text": None,
-        "context_next_text": None,
+        "paragraph_match_occurrence": None,
         "notes": "",
         "manual_override": False,
     }
 
 
-def normalize_record_schema(record: dict, index_fallback: int):
+def normalize_record_schema(record: dict, index_fallback: int, trust_version: bool = True):
+    """Bring a quote record up to the current layout.
+
+    With trust_version, a record already stamped with QUOTE_RECORD_SCHEMA_VERSION is
+    kept as is apart from the collection type guards; records read from disk pass
+    trust_version=False so every field is filled in and type-checked.
+    """
+    if trust_version and isinstance(record, dict) and record.get("schema_version") == QUOTE_RECORD_SCHEMA_VERSION:
+        if not isinstance(record.get("candidate_speakers"), list):
+            record["candidate_speakers"] = []
+        if not isinstance(record.get("candidate_scores"), dict):
+            record["candidate_scores"] = {}
+        return record
+    record = record if isinstance(record, dict) else {}
     raw_idx = record.get("index_raw")
     if raw_idx is None or str(raw_idx).strip() == "":
         raw_idx = str(record.get("index") or index_fallback)
@@ -1339,17 +1914,26 @@ def normalize_record_schema(record: dict, index_fallback: int):
         quote_with_marks=record.get("quote_with_marks") or record.get("quote_text") or "",
         content_type=record.get("content_type") or st.session_state.get("content_type", "Book"),
     )
-    base.update(record or {})
+    defaults = dict(base)
+    base.update(record)
+    # Context HTML/text used to be stored on the record; it is now derived on demand.
+    for key in LEGACY_CONTEXT_FIELDS:
+        base.pop(key, None)
+    base["schema_version"] = QUOTE_RECORD_SCHEMA_VERSION
     base["index"] = int(base.get("index") or index_fallback)
     base["index_raw"] = str(base.get("index_raw") or base["index"])
     base["quote_id"] = str(base.get("quote_id") or f"q{base['index']:05d}")
-    if not isinstance(base.get("candidate_speakers"), list):
-        base["candidate_speakers"] = []
-    if not isinstance(base.get("candidate_scores"), dict):
-        base["candidate_scores"] = {}
+    for key, types in QUOTE_RECORD_FIELD_TYPES.items():
+        if not isinstance(base.get(key), types):
+            base[key] = defaults[key]
     return base
 
 
+def compact_quote_record(record: dict) -> dict:
+    """The record without fields that still hold their QUOTE_RECORD_FIXED_DEFAULTS value."""
+    return {k: v for k, v in record.items() if k not in QUOTE_RECORD_FIXED_DEFAULTS or v != QUOTE_RECORD_FIXED_DEFAULTS[k]}
+
+
 def record_to_legacy_line(record: dict) -> str:
     idx = record.get("index_raw") or record.get("index") or 0
     speaker = record.get("speaker_text") or "Unknown"
@@ -1406,6 +1990,7 @@ def get_next_record_for_review(quotes_records, start_index=0):
 
 
 def update_record_speaker(record: dict, new_speaker: str, action_type: str = "correct"):
+    mark_record_dirty(record)
     prev = record.get("speaker_text") or "Unknown"
     cleaned = (new_speaker or "").strip()
     if action_type == "skip":
@@ -1443,26 +2028,80 @@ def append_review_event(record: dict, action_type: str, previous_speaker: str, n
     })
 
 
+def mark_record_dirty(record: dict):
+    """Flag a quote record as edited so the next sync re-normalises it and rewrites its line."""
+    st.session_state.setdefault("quotes_records_dirty", set()).add((record or {}).get("quote_id"))
+
+
 def sync_quotes_lines_from_records():
-    st.session_state.quotes_lines = build_quotes_lines_from_records(st.session_state.get("quotes_records") or [])
+    """Normalise quotes_records and keep quotes_lines derived from them.
+
+    After a full pass only records flagged by mark_record_dirty are revisited. A full
+    pass is made again whenever either list has been replaced since the last sync, or
+    a flagged quote_id cannot be placed.
+    """
+    records = st.session_state.get("quotes_records") or []
+    lines = st.session_state.get("quotes_lines")
+    dirty = st.session_state.get("quotes_records_dirty") or set()
+    synced = st.session_state.get("quotes_records_synced") or {}
+    positions = synced.get("positions")
+
+    if (
+        positions is not None
+        and synced.get("records") is records
+        and synced.get("lines") is lines
+        and len(lines) == len(records) == len(positions)
+        and all(positions.get(qid) is not None and records[positions[qid]].get("quote_id") == qid for qid in dirty)
+    ):
+        new_lines = None
+        changes = []
+        for qid in dirty:
+            i = positions[qid]
+            records[i] = normalize_record_schema(records[i], i + 1)
+            line = record_to_legacy_line(records[i])
+            if line != lines[i]:
+                # Copy rather than edit in place: deferred downloads may hold the old list.
+                if new_lines is None:
+                    new_lines = list(lines)
+                new_lines[i] = line
+                changes.append((i, line))
+        if new_lines is not None:
+            stats = get_speaker_stats()
+            st.session_state.quotes_lines = new_lines
+            bump_state_version("quotes_lines")
+            update_speaker_stats(stats, changes)
+            synced["lines"] = new_lines
+        dirty.clear()
+        return
+
+    for i, r in enumerate(records):
+        records[i] = normalize_record_schema(r, i + 1)
+    set_tracked_state("quotes_lines", build_quotes_lines_from_records(records))
+    positions = {r.get("quote_id"): i for i, r in enumerate(records)}
+    st.session_state.quotes_records_synced = {
+        "records": records,
+        "lines": st.session_state.quotes_lines,
+        "positions": positions,
+    }
+    st.session_state.quotes_records_dirty = set()
 
 
 def ensure_quotes_records_in_session():
     records = st.session_state.get("quotes_records")
     if records:
-        st.session_state.quotes_records = [normalize_record_schema(r, i + 1) for i, r in enumerate(records)]
         sync_quotes_lines_from_records()
         return
     qlines = st.session_state.get("quotes_lines")
     if qlines:
         st.session_state.quotes_records = build_quotes_records_from_quotes_lines(qlines)
+        bump_state_version("quotes_records")
         sync_quotes_lines_from_records()
 
 
 def migrate_legacy_state_to_quotes_records(data: dict):
     records = data.get("quotes_records")
     if records:
-        return [normalize_record_schema(r, i + 1) for i, r in enumerate(records)]
+        return [normalize_record_schema(r, i + 1, trust_version=False) for i, r in enumerate(records)]
     legacy_lines = data.get("quotes_lines")
     if legacy_lines:
         return build_quotes_records_from_quotes_lines(legacy_lines)
@@ -1481,7 +2120,7 @@ def auto_save():
     ensure_quotes_records_in_session()
     data = {
         "step": st.session_state.get("step", 1),
-        "quotes_records": st.session_state.get("quotes_records"),
+        "quotes_records": [compact_quote_record(r) for r in st.session_state.get("quotes_records") or []],
         "quotes_lines": st.session_state.get("quotes_lines"),
         "speaker_colors": st.session_state.get("speaker_colors"),
         "unknown_index": st.session_state.get("unknown_index", 0),
@@ -1515,44 +2154,11 @@ def auto_load():
         for key, value in data.items():
             st.session_state[key] = value
             # Normalise restored structures
-            if isinstance(st.session_state.get("flagged_names"), list):
-                st.session_state.flagged_names = set(st.session_state.flagged_names)
-            if st.session_state.get("speaker_counts") is None:
-                st.session_state.speaker_counts = {}
-            if st.session_state.get("flagged_names") is None:
-                st.session_state.flagged_names = set()
             if st.session_state.get("canonical_map") is None:
                 st.session_state.canonical_map = {}
             if st.session_state.get("review_events") is None:
                 st.session_state.review_events = []
 
-            # Rebuild counts/flags from quotes_lines if missing or empty
-            needs_rebuild = (
-                not st.session_state.speaker_counts or
-                (not st.session_state.flagged_names and st.session_state.speaker_counts)
-            )
-            if needs_rebuild and st.session_state.get("quotes_lines"):
-                pattern_speaker = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
-                counts_cap10 = {}
-                flagged = set()
-                for _line in st.session_state.quotes_lines:
-                    m = pattern_speaker.match(_line.strip())
-                    if not m:
-                        continue
-                    speaker_raw = m.group(1).strip()
-                    effective = smart_title(speaker_raw)
-                    norm = normalize_speaker_name(effective)
-                    if norm in flagged:
-                        continue
-                    c = counts_cap10.get(norm, 0)
-                    if c < 10:
-                        c += 1
-                        counts_cap10[norm] = c
-                        if c >= 10:
-                            flagged.add(norm)
-                st.session_state.speaker_counts = counts_cap10
-                st.session_state.flagged_names = flagged
-
         ensure_quotes_records_in_session()
 
         if "existing_speaker_colors" in st.session_state and st.session_state.existing_speaker_colors:
@@ -1563,6 +2169,7 @@ def auto_load():
             with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_docx:
                 tmp_docx.write(docx_bytes)
                 st.session_state.docx_path = tmp_docx.name
+            clear_step2_prefetch()
             # Ensure d_json_path points to the unified JSON cache: [userkey]-[book_name].json in CWD
             try:
                 userkey = st.session_state.get("userkey")
@@ -1577,6 +2184,8 @@ def auto_load():
                             write_paragraph_json_for_session()
             except Exception:
                 pass
+        for name in ("quotes_lines", "quotes_records", "speaker_colors", "canonical_map", "docx_path", "content_type"):
+            bump_state_version(name)
 
 
 if os.path.exists(get_progress_file()):
@@ -1690,15 +2299,16 @@ def effective_run_italic(run, paragraph):
 
 def extract_italicized_text(paragraph):
     """
-    def _trim_quote_edges(s: str) -> str:
-        # Italics-path parity: remove spaces just inside opening/closing double quotes
-        s = re.sub(r'(?<=[“\"])\\s+', '', s)
-        s = re.sub(r'\\s+(?=[”\"])', '', s)
-        return s
     Return a list of italic blocks for a paragraph.
     Detects italics after cascading: paragraph style -> character style -> direct run formatting.
     Preserves the existing >= 2-word threshold and smart_join behaviour.
     """
+    def _trim_quote_edges(s: str) -> str:
+        # Italics-path parity: remove spaces just inside opening/closing double quotes
+        s = re.sub(r'(?<=[“"])\s+', '', s)
+        s = re.sub(r'\s+(?=[”"])', '', s)
+        return s
+
     italic_blocks = []
     current_block = []
     for run in paragraph.runs:
@@ -2141,43 +2751,122 @@ def extract_dialogue_from_docx(book_name, docx_path):
 # DOCX-to-HTML & Marking Functions
 # ---------------------------
 
-def prepend_marker_to_paragraph(paragraph, marker_text):
-    p = paragraph._p
-    r = OxmlElement("w:r")
-    t = OxmlElement("w:t")
-    t.text = marker_text + " "
-    r.append(t)
-    p.insert(0, r)
-
-def create_marker_docx(original_docx, marker_docx):
-    doc = docx.Document(original_docx)
-    for idx, para in enumerate(doc.paragraphs):
-        marker = f"[[[P{idx}]]]"
-        prepend_marker_to_paragraph(para, marker)
-    doc.save(marker_docx)
+INDENT_ANCHOR_PREFIX = "scripter-indent-"
 
 def convert_docx_to_html_mammoth(docx_file):
     with open(docx_file, "rb") as f:
         result = mammoth.convert_to_html(f)
         return result.value
 
-def get_manual_indentation(docx_file):
-    doc = docx.Document(docx_file)
+def _twips_to_length(value):
+    try:
+        return Twips(int(value))
+    except (TypeError, ValueError):
+        return None
+
+def convert_docx_to_html_with_indentation(docx_file):
+    """Convert the DOCX with Mammoth and return (html, indented_paras).
+
+    A transform_document hook prepends an empty bookmark to every paragraph with
+    direct left/right indentation, which Mammoth writes as <a id="scripter-indent-N">
+    inside that paragraph's element. indented_paras maps N -> (left, right) lengths,
+    so no marker DOCX has to be written and re-read.
+    """
     indented_paras = {}
-    for idx, para in enumerate(doc.paragraphs):
-        left = para.paragraph_format.left_indent
-        right = para.paragraph_format.right_indent
+
+    def tag_indented(paragraph):
+        indent = paragraph.indent
+        left = _twips_to_length(indent.start) if indent else None
+        right = _twips_to_length(indent.end) if indent else None
         if (left is not None and left.pt > 0) or (right is not None and right.pt > 0):
-            indented_paras[idx] = (left, right)
-    return indented_paras
+            anchor_idx = len(indented_paras)
+            indented_paras[anchor_idx] = (left, right)
+            anchor = mammoth.documents.bookmark(f"{INDENT_ANCHOR_PREFIX}{anchor_idx}")
+            return paragraph.copy(children=[anchor] + list(paragraph.children))
+        return paragraph
+
+    with open(docx_file, "rb") as f:
+        result = mammoth.convert_to_html(f, transform_document=mammoth.transforms.paragraph(tag_indented))
+    return result.value, indented_paras
 
 def convert_length_to_px(length):
     return length.pt * 1.33 if length is not None else 0
 
-# ---------------------------
+def docx_content_hash(docx_path):
+    h = hashlib.sha256()
+    with open(docx_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=8, persist="disk")
+def convert_docx_for_step4(content_hash, _docx_path):
+    """Mammoth HTML, indentation metadata and candidate texts for one DOCX.
+
+    Keyed by the DOCX content hash (docx_path is a per-upload temp file and is
+    not part of the key), so quote or colour changes only re-run highlighting.
+    Kept in memory for the last few documents and persisted to disk for reloads.
+    """
+    html, indented_paras = convert_docx_to_html_with_indentation(_docx_path)
+    # Cached values are pickled, and a Twips converts its EMU value again when
+    # unpickled; keep the lengths as plain Length so margins survive a cache hit.
+    indented_paras = {
+        idx: tuple(None if length is None else Length(length) for length in pair)
+        for idx, pair in indented_paras.items()
+    }
+    candidate_texts = [text for _, _, _, text in build_candidate_info(parse_html(html))]
+    return {"html": html, "indented_paras": indented_paras, "candidate_texts": candidate_texts}
+
+# ---------------------------
 # Dialogue Highlighting Functions
 # ---------------------------
-def highlight_across_nodes(parent, quote, highlight_style, soup):
+def speaker_css_class(norm_speaker):
+    """Return the compact CSS class used for every highlight span of a (normalized) speaker.
+
+    Names that survive slugging unchanged (e.g. 'james the paramedic') map to a readable
+    class ('sp-james-the-paramedic'); anything lossy gets a short hash suffix so that
+    distinct speakers can never share a class.
+    """
+    norm_speaker = norm_speaker or ""
+    slug = re.sub(r"[^a-z0-9]+", "-", norm_speaker).strip("-")
+    if slug.replace("-", " ") != norm_speaker:
+        slug = f"{slug}-{zlib.crc32(norm_speaker.encode('utf-8')):08x}".lstrip("-")
+    return f"sp-{slug}"
+
+def highlight_css_for_color(color_choice):
+    """CSS declarations for a COLOR_PALETTE entry (same colours the inline styles used to carry)."""
+    rgba = COLOR_PALETTE.get(color_choice, COLOR_PALETTE["none"])
+    if color_choice == "none":
+        return f"color: rgb({rgba[0]}, {rgba[1]}, {rgba[2]}); background-color: transparent;"
+    if not rgba[4]:
+        # "error": no text colour override, transparent background.
+        return f"background-color: rgba({rgba[0]}, {rgba[1]}, {rgba[2]}, {rgba[3]});"
+    return f"color: {rgba[4]}; background-color: rgba({rgba[0]}, {rgba[1]}, {rgba[2]}, {rgba[3]});"
+
+def speaker_color_choice(norm_speaker, speaker_colors):
+    if norm_speaker == "unknown":
+        return "none"
+    return (speaker_colors or {}).get(norm_speaker, "none")
+
+def build_speaker_stylesheet(speakers, speaker_colors):
+    """One CSS rule per speaker class, derived from COLOR_PALETTE and speaker_colors.
+
+    `speakers` may be display or normalized names; every speaker that can appear in a
+    highlight span needs a rule, so callers pass the union of quote speakers and colour keys.
+    Re-colouring only needs this stylesheet regenerated, not the highlighted body.
+    """
+    rules = []
+    seen = set()
+    for sp in list(speakers or []) + list((speaker_colors or {}).keys()):
+        norm = normalize_speaker_name(str(sp))
+        if norm in seen:
+            continue
+        seen.add(norm)
+        css = highlight_css_for_color(speaker_color_choice(norm, speaker_colors))
+        rules.append(f"span.highlight.{speaker_css_class(norm)} {{ {css} }}")
+    return "\n".join(rules)
+
+def highlight_across_nodes(parent, quote, highlight_class, soup):
     full_text = parent.get_text()
     full_text_lower = match_normalize(full_text).lower()
     quote_lower = match_normalize(quote).lower()
@@ -2203,7 +2892,7 @@ def highlight_across_nodes(parent, quote, highlight_style, soup):
                 new_nodes = []
                 if before:
                     new_nodes.append(NavigableString(before))
-                span_tag = soup.new_tag("span", attrs={"class": "highlight", "style": highlight_style})
+                span_tag = soup.new_tag("span", attrs={"class": ["highlight", highlight_class]})
                 span_tag.string = match_text
                 new_nodes.append(span_tag)
                 if after:
@@ -2212,7 +2901,7 @@ def highlight_across_nodes(parent, quote, highlight_style, soup):
             running_index += text_length
     return True
 
-def highlight_quote_in_parent(parent, quote, highlight_style, soup):
+def highlight_quote_in_parent(parent, quote, highlight_class, soup):
     stripped_quote = quote.strip('“”"')
     stripped_quote_lower = match_normalize(stripped_quote).lower()
     for child in parent.contents:
@@ -2227,7 +2916,7 @@ def highlight_quote_in_parent(parent, quote, highlight_style, soup):
                 new_nodes = []
                 if before:
                     new_nodes.append(NavigableString(before))
-                span_tag = soup.new_tag("span", attrs={"class": "highlight", "style": highlight_style})
+                span_tag = soup.new_tag("span", attrs={"class": ["highlight", highlight_class]})
                 span_tag.string = match_text
                 new_nodes.append(span_tag)
                 if after:
@@ -2235,9 +2924,9 @@ def highlight_quote_in_parent(parent, quote, highlight_style, soup):
                 child.replace_with(*new_nodes)
                 return True
         elif hasattr(child, 'contents'):
-            if highlight_quote_in_parent(child, quote, highlight_style, soup):
+            if highlight_quote_in_parent(child, quote, highlight_class, soup):
                 return True
-    return highlight_across_nodes(parent, stripped_quote, highlight_style, soup)
+    return highlight_across_nodes(parent, stripped_quote, highlight_class, soup)
 
 def find_with_boundaries(haystack, needle, start=0):
     """Find needle in haystack from start, requiring word-boundaries when needle begins/ends with alphanumerics.
@@ -2267,18 +2956,20 @@ def find_with_boundaries(haystack, needle, start=0):
 
     return -1
 
-def build_candidate_info(soup):
+def build_candidate_info(soup, candidate_texts=None):
     candidates = soup.find_all(['p', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+    if candidate_texts is not None and len(candidate_texts) != len(candidates):
+        candidate_texts = None
     candidate_info = []
     global_offset = 0
-    for candidate in candidates:
-        text = candidate.get_text()
+    for i, candidate in enumerate(candidates):
+        text = candidate.get_text() if candidate_texts is None else candidate_texts[i]
         length = len(text)
         candidate_info.append((candidate, global_offset, global_offset + length, text))
         global_offset += length
     return candidate_info
 
-def highlight_in_candidate(candidate, quote, highlight_style, soup, start_offset=0, strict=False):
+def highlight_in_candidate(candidate, quote, highlight_class, soup, start_offset=0, strict=False):
     full_text = candidate.get_text()
 
     # Case-sensitive, boundary-aware search (strictness is controlled by what 'quote' is:
@@ -2308,7 +2999,7 @@ def highlight_in_candidate(candidate, quote, highlight_style, soup, start_offset
                 new_nodes = []
                 if before:
                     new_nodes.append(NavigableString(before))
-                span_tag = soup.new_tag("span", attrs={"class": "highlight", "style": highlight_style})
+                span_tag = soup.new_tag("span", attrs={"class": ["highlight", highlight_class]})
                 span_tag.string = match_text
                 new_nodes.append(span_tag)
                 if after:
@@ -2319,49 +3010,57 @@ def highlight_in_candidate(candidate, quote, highlight_style, soup, start_offset
 
     return match_end
 
-def highlight_dialogue_in_html(html, quotes_list, speaker_colors):
-    soup = BeautifulSoup(html, "html.parser")
-    candidate_info = build_candidate_info(soup)
+def highlight_dialogue_in_soup(soup, quotes_list, candidate_texts=None):
+    """Highlight every quote in an already-parsed document, in place.
+
+    candidate_texts, when given, are the precomputed get_text() of each candidate
+    block (see convert_docx_for_step4). Returns the list of unmatched quote descriptions.
+    """
+    candidate_info = build_candidate_info(soup, candidate_texts)
+    # Global offsets are positions in the joined candidate text; highlighting only
+    # wraps nodes, so both stay valid for the whole pass.
+    joined_text = "".join(text for _, _, _, text in candidate_info)
+    candidate_ends = array("I", (end for _, _, end, _ in candidate_info))
     unmatched_quotes = []
     last_global_offset = 0
 
-    def style_for_speaker(speaker):
-        norm_speaker = normalize_speaker_name(speaker)
-        color_choice = st.session_state.speaker_colors.get(norm_speaker, "none")
-        if norm_speaker == "unknown":
-            color_choice = "none"
-        rgba = COLOR_PALETTE.get(color_choice, COLOR_PALETTE["none"])
-        if color_choice == "none":
-            return f"color: rgb({rgba[0]}, {rgba[1]}, {rgba[2]}); background-color: transparent;"
-        return f"color: {rgba[4]}; background-color: rgba({rgba[0]}, {rgba[1]}, {rgba[2]}, {rgba[3]});"
+    def class_for_speaker(speaker):
+        # Colours live in the stylesheet from build_speaker_stylesheet(); spans only carry the class.
+        return speaker_css_class(normalize_speaker_name(speaker))
 
     def search_and_highlight_from_global(needle, start_global):
-        """Search forward from a global offset for needle (case-sensitive, boundary-aware)."""
+        """Search forward from a global offset for needle (case-sensitive, boundary-aware).
+
+        Raw occurrences are found in the joined text and bisected to their candidate,
+        so only candidates that actually contain the needle are examined.
+        """
         nonlocal last_global_offset
         if not needle:
             return False
 
-        for candidate, start, end, text in candidate_info:
-            if end <= start_global:
-                continue
-
-            local_start = max(0, start_global - start) if start_global > start else 0
-            pos = find_with_boundaries(text, needle, local_start)
-            if pos == -1:
+        probe = start_global
+        while True:
+            hit = joined_text.find(needle, probe)
+            if hit == -1:
+                return False
+            candidate, start, end, text = candidate_info[bisect.bisect_right(candidate_ends, hit)]
+            if hit + len(needle) > end:
+                # Spans two candidates, so it is not a match inside either.
+                probe = hit + 1
                 continue
 
-            match_end_local = highlight_in_candidate(candidate, needle, current_style, soup, local_start, strict=True)
-            if match_end_local is None:
-                continue
-
-            last_global_offset = start + match_end_local
-            return True
-
-        return False
+            local_start = max(0, start_global - start)
+            match_end_local = None
+            if find_with_boundaries(text, needle, local_start) != -1:
+                match_end_local = highlight_in_candidate(candidate, needle, current_class, soup, local_start, strict=True)
+            if match_end_local is not None:
+                last_global_offset = start + match_end_local
+                return True
+            probe = end
 
     for quote_data in quotes_list:
         speaker = quote_data.get("speaker", "")
-        current_style = style_for_speaker(speaker)
+        current_class = class_for_speaker(speaker)
 
         quote_with_marks = (quote_data.get("quote_with_marks") or "").strip()
         quote_plain = (quote_data.get("quote") or "").strip()
@@ -2384,40 +3083,41 @@ def highlight_dialogue_in_html(html, quotes_list, speaker_colors):
         if not matched:
             unmatched_quotes.append(f"{quote_data.get('speaker','')}: \"{quote_data.get('quote','')}\" [Index: {quote_data.get('index','')}]")
 
+    return unmatched_quotes
+
+def record_unmatched_quotes(unmatched_quotes):
+    st.session_state.unmatched_quotes_count = len(unmatched_quotes)
     if unmatched_quotes:
         unmatched_quotes_filename = get_unmatched_quotes_filename()
         with open(unmatched_quotes_filename, "w", encoding="utf-8") as f:
             f.write("\n".join(unmatched_quotes))
         st.write(f"⚠️ Unmatched quotes saved to '[userkey]-unmatched_quotes.txt' ({len(unmatched_quotes)} entries)")
 
-    return str(soup)
+def highlight_dialogue_in_html(html, quotes_list):
+    soup = parse_html(html)
+    record_unmatched_quotes(highlight_dialogue_in_soup(soup, quotes_list))
+    return serialize_html(soup)
 
-def apply_manual_indentation_with_markers(original_docx, html):
-    indented_paras = get_manual_indentation(original_docx)
-    soup = BeautifulSoup(html, "html.parser")
-    marker_regex = re.compile(r"\[\[\[P(\d+)\]\]\]")
+def apply_manual_indentation_in_soup(soup, indented_paras):
+    """Turn the indentation anchors from convert_docx_to_html_with_indentation()
+    into inline margins on their paragraph elements, removing the anchors."""
     candidate_tags = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li']
-    for tag in soup.find_all(candidate_tags):
-        text = tag.get_text()
-        match = marker_regex.search(text)
-        if match:
-            para_index = int(match.group(1))
-            for text_node in tag.find_all(string=True):
-                if marker_regex.search(text_node):
-                    new_text = marker_regex.sub("", text_node)
-                    text_node.replace_with(new_text)
-            if para_index in indented_paras:
-                left, right = indented_paras[para_index]
-                left_px = convert_length_to_px(left)
-                right_px = convert_length_to_px(right)
-                style_str = f"margin-left: {left_px}px; margin-right: {right_px}px;"
-                if tag.has_attr("style"):
-                    tag["style"] += " " + style_str
-                else:
-                    tag["style"] = style_str
-    return str(soup)
+    anchor_id = re.compile("^" + re.escape(INDENT_ANCHOR_PREFIX) + r"(\d+)$")
+    for anchor in soup.find_all("a", id=anchor_id):
+        tag = anchor.parent
+        para_index = int(anchor_id.match(anchor["id"]).group(1))
+        anchor.decompose()
+        if tag is not None and tag.name in candidate_tags and para_index in indented_paras:
+            left, right = indented_paras[para_index]
+            left_px = convert_length_to_px(left)
+            right_px = convert_length_to_px(right)
+            style_str = f"margin-left: {left_px}px; margin-right: {right_px}px;"
+            if tag.has_attr("style"):
+                tag["style"] += " " + style_str
+            else:
+                tag["style"] = style_str
 
-def transform_script_layout(html: str) -> str:
+def transform_script_layout_in_soup(soup):
     """
     Post-process the HTML produced by Mammoth + highlighting so that
     script dialogue lines are rendered as:
@@ -2430,9 +3130,9 @@ def transform_script_layout(html: str) -> str:
     We only transform <p> elements that:
       - contain at least one <span class="highlight"> (i.e. actual dialogue), and
       - start with something like 'NAME:' in ALL CAPS.
-    """
-    soup = BeautifulSoup(html, "html.parser")
 
+    Works in place on an already-parsed document.
+    """
     for p in soup.find_all("p"):
         # Only touch paragraphs that contain highlighted dialogue
         if not p.find("span", class_="highlight"):
@@ -2446,17 +3146,31 @@ def transform_script_layout(html: str) -> str:
 
         speaker = m.group(1).strip()
 
-        # Remove the speaker prefix from the *HTML* content, not just the text
-        inner_html = p.decode_contents()
+        # Remove the speaker prefix from the leading text nodes, not just the text
+        lead_nodes = []
+        for child in p.contents:
+            if type(child) is not NavigableString:
+                break
+            lead_nodes.append(child)
         # Strip "  NAME   :   " + optional tabs/spaces
         prefix_pattern = r"^\s*" + re.escape(speaker) + r"\s*:\s*[\t ]*"
-        dialogue_html, n_subs = re.subn(prefix_pattern, "", inner_html, count=1)
-        if n_subs == 0:
+        prefix_match = re.match(prefix_pattern, "".join(lead_nodes))
+        if not prefix_match:
             # Couldn't safely strip; skip this paragraph
             continue
 
-        # Clear the paragraph and rebuild
-        p.clear()
+        # Detach the dialogue nodes, dropping the prefix characters
+        to_strip = prefix_match.end()
+        dialogue_nodes = []
+        for child in list(p.contents):
+            child.extract()
+            if to_strip and type(child) is NavigableString:
+                text = str(child)
+                child = NavigableString(text[to_strip:])
+                to_strip = max(0, to_strip - len(text))
+                if not child:
+                    continue
+            dialogue_nodes.append(child)
 
         # Remove margin-left from inline style, keep other style properties
         if p.has_attr("style"):
@@ -2482,21 +3196,50 @@ def transform_script_layout(html: str) -> str:
 
         # Dialogue span – preserve existing highlight spans etc.
         dialogue_span = soup.new_tag("span", attrs={"class": "script-dialogue"})
-        frag = BeautifulSoup(dialogue_html, "html.parser")
-        for child in frag.contents:
+        for child in dialogue_nodes:
             dialogue_span.append(child)
         p.append(dialogue_span)
 
-    return str(soup)
+def transform_script_layout(html: str) -> str:
+    soup = parse_html(html)
+    transform_script_layout_in_soup(soup)
+    return serialize_html(soup)
 
 
 # -------------------------
 # ---------------------------
 # Summary & Ranking Functions
 # ---------------------------
-def generate_summary_html(quotes_list, speakers, speaker_colors):
-    counts = Counter(quote["speaker"] for quote in quotes_list)
-    total_lines = sum(counts.values())
+def aggregate_quote_reports(quotes_list):
+    """Everything the summary, ranking and first-lines reports need, in one pass.
+
+    counts is keyed by speaker in order of first appearance; first_lines maps the
+    normalized speaker to their first line of 3+ words (else their first line).
+    """
+    counts = Counter()
+    norms = {}
+    first_lines = {}
+    substantial = set()
+    for quote in quotes_list:
+        speaker = quote["speaker"]
+        counts[speaker] += 1
+        norm = norms.get(speaker)
+        if norm is None:
+            norm = norms[speaker] = normalize_speaker_name(speaker)
+        if norm in substantial:
+            continue
+        text = quote["quote"].strip()
+        if len(text.split()) >= 3:
+            first_lines[norm] = text
+            substantial.add(norm)
+        elif norm not in first_lines:
+            first_lines[norm] = text
+    return {"counts": counts, "total": len(quotes_list), "first_lines": first_lines}
+
+def generate_summary_html(quotes_list, speakers, aggregate=None):
+    aggregate = aggregate or aggregate_quote_reports(quotes_list)
+    counts = aggregate["counts"]
+    total_lines = aggregate["total"]
     summary_order = []
     if "Unknown" in counts:
         summary_order.append("Unknown")
@@ -2514,21 +3257,15 @@ def generate_summary_html(quotes_list, speakers, speaker_colors):
             continue
         count = counts.get(sp, 0)
         percentage = round((count / total_lines) * 100) if total_lines > 0 else 0
-        color_key = speaker_colors.get(normalize_speaker_name(sp), "none")
-        if sp.lower() == "unknown":
-            color_key = "none"
-        rgba = COLOR_PALETTE.get(color_key, COLOR_PALETTE["none"])
-        if color_key == "none":
-            style = f"color: rgb({rgba[0]}, {rgba[1]}, {rgba[2]}); background-color: transparent;"
-        else:
-            style = f"color: {rgba[4]}; background-color: rgba({rgba[0]}, {rgba[1]}, {rgba[2]}, {rgba[3]});"
-        lines.append(f'<p style="margin: 0; line-height: 1.2; padding: 8px 0;"><span class="highlight" style="{style}">{sp}</span> - {count} lines - {percentage}%</p>')
+        sp_class = speaker_css_class(normalize_speaker_name(sp))
+        lines.append(f'<p style="margin: 0; line-height: 1.2; padding: 8px 0;"><span class="highlight {sp_class}">{sp}</span> - {count} lines - {percentage}%</p>')
     lines.append('</div>')
     return "\n".join(lines)
 
-def generate_ranking_html(quotes_list, speaker_colors):
-    counts = Counter(quote["speaker"] for quote in quotes_list)
-    total_lines = sum(counts.values())
+def generate_ranking_html(quotes_list, aggregate=None):
+    aggregate = aggregate or aggregate_quote_reports(quotes_list)
+    counts = aggregate["counts"]
+    total_lines = aggregate["total"]
     filtered = [(sp, count) for sp, count in counts.items() if sp.lower() not in ("unknown", "do not read", "error") and count > 1]
     filtered.sort(key=lambda x: x[1], reverse=True)
     lines = []
@@ -2536,33 +3273,14 @@ def generate_ranking_html(quotes_list, speaker_colors):
     lines.append('<h2 style="margin: 0 0 5px 0;">Speaker Ranking</h2>')
     for sp, count in filtered:
         percentage = round((count / total_lines) * 100) if total_lines > 0 else 0
-        color_key = speaker_colors.get(normalize_speaker_name(sp), "none")
-        rgba = COLOR_PALETTE.get(color_key, COLOR_PALETTE["none"])
-        if color_key == "none":
-            style = f"color: rgb({rgba[0]}, {rgba[1]}, {rgba[2]}); background-color: transparent;"
-        else:
-            style = f"color: {rgba[4]}; background-color: rgba({rgba[0]}, {rgba[1]}, {rgba[2]}, {rgba[3]});"
-        lines.append(f'<p style="margin: 0; line-height: 1.2; padding: 8px 0;"><span class="highlight" style="{style}">{sp}</span> - {count} lines - {percentage}%</p>')
+        sp_class = speaker_css_class(normalize_speaker_name(sp))
+        lines.append(f'<p style="margin: 0; line-height: 1.2; padding: 8px 0;"><span class="highlight {sp_class}">{sp}</span> - {count} lines - {percentage}%</p>')
     lines.append('</div>')
     return "\n".join(lines)
 
-def generate_first_lines_html(quotes_list, speakers):
-    # Map: speaker (canonical) -> first qualifying quote
-    first_lines = {}
-    for quote in quotes_list:
-        speaker = quote["speaker"]
-        norm = normalize_speaker_name(speaker)
-        # Only add the first qualifying line (3+ words, else first)
-        if norm not in first_lines:
-            words = quote["quote"].strip().split()
-            if len(words) >= 3 or all(q["speaker"] != speaker for q in quotes_list if q != quote):
-                first_lines[norm] = quote["quote"].strip()
-            else:
-                # Tentatively store, may be replaced by a later 3+ word line
-                first_lines[norm] = quote["quote"].strip()
-        else:
-            if len(first_lines[norm].split()) < 3 and len(quote["quote"].strip().split()) >= 3:
-                first_lines[norm] = quote["quote"].strip()
+def generate_first_lines_html(quotes_list, speakers, aggregate=None):
+    # Map: speaker (canonical) -> first qualifying quote (3+ words, else first)
+    first_lines = (aggregate or aggregate_quote_reports(quotes_list))["first_lines"]
 
     lines = []
     lines.append('<div id="first-lines-summary" style="border: 1px solid #ccc; padding: 10px; margin-bottom: 20px;">')
@@ -2576,51 +3294,199 @@ def generate_first_lines_html(quotes_list, speakers):
             lines.append(f'<p style="margin: 0; line-height: 1.2; padding: 8px 0;"><span class="highlight">{sp}</span>: <span style="font-style: italic;">{line}</span></p>')
     lines.append('</div>')
     return "\n".join(lines)
-  
+
+def build_reports_html(quotes_list, speakers):
+    """Summary, ranking and first-lines reports from a single aggregation pass."""
+    aggregate = aggregate_quote_reports(quotes_list)
+    return (
+        generate_summary_html(quotes_list, speakers, aggregate)
+        + "\n<br><br><br>\n" + generate_ranking_html(quotes_list, aggregate)
+        + "\n<br><br><br>\n" + generate_first_lines_html(quotes_list, speakers, aggregate) + "\n"
+    )
+
+# ---------------------------
+# Step 4 Document & Preview Functions
+# ---------------------------
+PREVIEW_PAGE_MAX_CHARS = 60000
+PREVIEW_SCOPE_CLASS = "scripter-preview"
+
+def build_step4_css(fontsel, speaker_css, scope=None):
+    """CSS shared by the downloadable HTML and the Step 4 preview.
+
+    With scope=None the rules target the standalone document (body, span, ...).
+    With a scope class they are prefixed so the preview can be rendered inline in
+    the app page without restyling the rest of the UI.
+    """
+    root = f".{scope}" if scope else "body"
+    pre = f".{scope} " if scope else ""
+    return f"""
+    {root} {{
+      font-family: '{fontsel}', sans-serif;
+      line-height: 2;
+      max-width: 500px;
+      margin: auto;
+    }}
+    {pre}span {{
+      padding: 0;
+    }}
+    {pre}span.highlight {{
+      background-color: var(--highlight-color, transparent);
+      padding: 0.33em 0px;
+      box-decoration-break: clone;
+      -webkit-box-decoration-break: clone;
+    }}
+
+    /* Speaker colours (one rule per speaker class) */
+    {speaker_css}
+
+    /* Script layout */
+    {pre}p.script-line {{
+      margin-left: 0;
+      text-indent: 0;
+      display: grid;
+      grid-template-columns: 9em 1fr;  /* fixed speaker column width */
+      column-gap: 0.75em;
+    }}
+    {pre}.script-speaker {{
+      font-weight: bold;
+    }}
+    {pre}.script-dialogue {{
+      /* dialogue automatically takes remaining space in the second column */
+    }}
+"""
+
+def build_final_html(book_name, fontsel, speaker_css, body_html):
+    """Assemble the standalone Step 4 HTML document (fonts embedded as Base64)."""
+    font_face_html = build_font_face_css(fontsel, embed_base64=True)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>{book_name}</title>
+  <style>
+    {font_face_html}
+{build_step4_css(fontsel, speaker_css)}
+  </style>
+</head>
+<body>
+{body_html}
+</body>
+</html>
+"""
+
+def build_preview_pages(body_html, max_chars=PREVIEW_PAGE_MAX_CHARS):
+    """Split the highlighted body into chapter-sized pages for the Step 4 preview.
+
+    A new page starts at every top-level <h1>/<h2> (chapter heading), and long
+    stretches without headings are cut at the next block once they exceed
+    max_chars. Returns a list of {"title": ..., "html": ...}. body_html may also
+    be an already-parsed document; the pages concatenate back to the full body.
+    """
+    soup = body_html if isinstance(body_html, BeautifulSoup) else parse_html(body_html)
+    pages = []
+    current = []
+    current_len = 0
+    current_title = "Opening"
+    last_heading = None
+
+    def flush():
+        if current:
+            pages.append({"title": f"{len(pages) + 1}. {current_title}", "html": "".join(current)})
+
+    for node in html_root(soup).contents:
+        chunk = str(node)
+        is_heading = getattr(node, "name", None) in ("h1", "h2")
+        if current and (is_heading or current_len >= max_chars):
+            flush()
+            current = []
+            current_len = 0
+            current_title = f"{last_heading} (continued)" if last_heading else "Opening (continued)"
+        if is_heading:
+            heading_text = re.sub(r"\s+", " ", node.get_text()).strip()[:60]
+            if heading_text:
+                last_heading = heading_text
+                if not current:
+                    current_title = heading_text
+        current.append(chunk)
+        current_len += len(chunk)
+    flush()
+    return pages
+
+def render_step4_body(html, indented_paras, quotes_list, content_type="Book", candidate_texts=None):
+    """Parse the Mammoth HTML once and run every Step 4 transform over that tree.
+
+    Highlighting, manual indentation and (for scripts) the script layout are
+    in-place passes; the tree is serialised once, page by page. Returns the
+    pages; the full body is their concatenation.
+    """
+    soup = parse_html(html)
+    record_unmatched_quotes(highlight_dialogue_in_soup(soup, quotes_list, candidate_texts))
+    apply_manual_indentation_in_soup(soup, indented_paras)
+    if content_type == "Script":
+        transform_script_layout_in_soup(soup)
+    return build_preview_pages(soup)
+
+def compute_step4_render_key():
+    """Version of every input that changes the highlighted Step 4 body.
+
+    Colours only reach the output through the speaker stylesheet, which is
+    rebuilt on its own key."""
+    return state_version("quotes_lines", "canonical_map", "docx_path", "content_type")
+
+def build_preview_page_html(page_html, fontsel, speaker_css):
+    """Wrap one preview page in a scoped container. Fonts come from the app's own
+    @font-face rules, so no Base64 font data is sent with each page."""
+    return (
+        f"<style>{build_step4_css(fontsel, speaker_css, scope=PREVIEW_SCOPE_CLASS)}</style>"
+        f'<div class="{PREVIEW_SCOPE_CLASS}">{page_html}</div>'
+    )
+
+def shift_preview_page(delta, page_count):
+    current = st.session_state.get("preview_page", 0)
+    st.session_state.preview_page = min(max(0, current + delta), max(0, page_count - 1))
+
 # ---------------------------
 # Canonical Speaker & Quote Functions
 # ---------------------------
-def get_canonical_speakers(quotes_file):
-    speakers = []
-    pattern = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
-    with open(quotes_file, "r", encoding="utf-8") as f:
-        for line in f:
-            match = pattern.match(line.strip())
-            if match:
-                speaker_raw = match.group(1).strip()
-                speakers.append(smart_title(str(speaker_raw)))  # Ensure it's a string
-    seen = set()
-    canonical_speakers = []
-    for s in speakers:
-        norm = normalize_speaker_name(str(s))
-        if norm not in seen:
-            seen.add(norm)
-            canonical_speakers.append(s)
-    canonical_map = {normalize_speaker_name(str(s)): s for s in canonical_speakers}
-    return canonical_speakers, canonical_map
-
-def load_quotes(quotes_file, canonical_map):
+def get_canonical_speakers():
+    """(canonical_speakers, canonical_map) for the session's quotes.
+
+    canonical_speakers lists each speaker as first written, in order of first
+    appearance; canonical_map maps the normalized name to that spelling. Read from
+    the speaker statistics, so it follows attributions without rescanning.
+    """
+    stats = get_speaker_stats()
+    registry = stats.get("registry")
+    if registry is None:
+        first = stats["first"]
+        canonical_speakers = [speaker_display_name(stats, norm) for norm in sorted(first, key=first.get)]
+        canonical_map = {normalize_speaker_name(s): s for s in canonical_speakers}
+        registry = stats["registry"] = (canonical_speakers, canonical_map)
+    return registry
+
+# Capture optional opening/closing quotes so we can do a strict first-pass match INCLUDING quote marks.
+_LOAD_QUOTE_RE = re.compile(r"^\s*([0-9]+(?:[a-zA-Z]+)?)\.\s+([^:]+):\s*([“\"])?(.+?)([”\"])?\s*$")
+
+def load_quotes(quotes_lines, canonical_map):
     quotes_list = []
-    # Capture optional opening/closing quotes so we can do a strict first-pass match INCLUDING quote marks.
-    pattern = re.compile(r"^\s*([0-9]+(?:[a-zA-Z]+)?)\.\s+([^:]+):\s*([“\"])?(.+?)([”\"])?\s*$")
-    with open(quotes_file, "r", encoding="utf-8") as f:
-        for line in f:
-            match = pattern.match(line.strip())
-            if match:
-                index, speaker_raw, open_q, quote_inner_raw, close_q = match.groups()
-                effective = smart_title(speaker_raw)
-                norm = normalize_speaker_name(effective)
-                canonical = canonical_map.get(norm, effective)
+    for line in quotes_lines or []:
+        match = _LOAD_QUOTE_RE.match(line.strip())
+        if match:
+            index, speaker_raw, open_q, quote_inner_raw, close_q = match.groups()
+            effective = smart_title(speaker_raw)
+            norm = normalize_speaker_name(effective)
+            canonical = canonical_map.get(norm, effective)
 
-                quote_inner = quote_inner_raw.strip()
-                quote_with_marks = f"{open_q or ''}{quote_inner}{close_q or ''}"
+            quote_inner = quote_inner_raw.strip()
+            quote_with_marks = f"{open_q or ''}{quote_inner}{close_q or ''}"
 
-                quotes_list.append({
-                    "index": index,
-                    "speaker": canonical,
-                    "quote": quote_inner,
-                    "quote_with_marks": quote_with_marks
-                })
+            quotes_list.append({
+                "index": index,
+                "speaker": canonical,
+                "quote": quote_inner,
+                "quote_with_marks": quote_with_marks
+            })
     return quotes_list
 
 def load_existing_colors():
@@ -2628,13 +3494,93 @@ def load_existing_colors():
     with open(get_saved_colors_file(), "r", encoding="utf-8") as f:
         loaded_colors = json.load(f)
     normalized_loaded = {normalize_speaker_name(k): v for k, v in loaded_colors.items()}
-    st.session_state.speaker_colors = normalized_loaded
+    set_tracked_state("speaker_colors", normalized_loaded)
     st.session_state.existing_speaker_colors = normalized_loaded
 
 def save_speaker_colors(speaker_colors):
     with open(get_saved_colors_file(), "w", encoding="utf-8") as f:
         json.dump(speaker_colors, f, indent=4, ensure_ascii=False)
 
+# Colour pickers are shown a page at a time inside a form, so choosing a colour does
+# not rerun the script. Picks made on other pages are held in session state until the
+# batch is saved, and only the entries that changed are written.
+STEP3_COLOR_PAGE_SIZE = 40
+
+def commit_speaker_colors(changes):
+    """Merge {normalized speaker: colour} into speaker_colors and return what changed.
+
+    A speaker with no entry counts as "none", as in speaker_color_choice(). The
+    colours file is only rewritten when something actually changed.
+    """
+    current = {normalize_speaker_name(k): v for k, v in (st.session_state.get("speaker_colors") or {}).items()}
+    changed = {norm: color for norm, color in changes.items() if current.get(norm, "none") != color}
+    if changed:
+        current.update(changed)
+        set_tracked_state("speaker_colors", current)
+        st.session_state.existing_speaker_colors = current.copy()
+        save_speaker_colors(current)
+    return changed
+
+def auto_assign_colors(speakers, speaker_colors, counts):
+    """A palette colour for each of `speakers`, busiest first, starting with colours no one uses yet."""
+    palette = [c for c in COLOR_PALETTE if c not in ("none", "do not read", "error")]
+    used = set((speaker_colors or {}).values())
+    order = [c for c in palette if c not in used] + [c for c in palette if c in used]
+    ranked = sorted(speakers, key=lambda sp: -counts.get(normalize_speaker_name(sp), 0))
+    return {normalize_speaker_name(sp): order[i % len(order)] for i, sp in enumerate(ranked)}
+
+def speaker_color_form(form_key, speakers, colors, commit_labels):
+    """Paged colour form for `speakers`; returns (label, picks) once a commit button is pressed.
+
+    picks maps every normalized speaker picked on any page to its colour. Until then
+    it returns (None, None); moving between pages only reruns to show the next page.
+    """
+    color_options = [color.title() for color in COLOR_PALETTE.keys() if color.lower() != "do not read"]
+    pending = st.session_state.setdefault(f"{form_key}_pending", {})
+    page_count = max(1, -(-len(speakers) // STEP3_COLOR_PAGE_SIZE))
+    page = min(max(st.session_state.get(f"{form_key}_page", 0), 0), page_count - 1)
+    start = page * STEP3_COLOR_PAGE_SIZE
+    page_speakers = speakers[start:start + STEP3_COLOR_PAGE_SIZE]
+
+    picks = {}
+    with st.form(form_key):
+        if page_count > 1:
+            st.caption(f"Speakers {start + 1}–{start + len(page_speakers)} of {len(speakers)}")
+        for sp in page_speakers:
+            norm = normalize_speaker_name(sp)
+            default_color = pending.get(norm, colors.get(norm, "none"))
+            try:
+                default_index = color_options.index(default_color.title())
+            except ValueError:
+                default_index = color_options.index("None")
+            picks[norm] = st.selectbox(sp, options=color_options, index=default_index, key=f"{form_key}_color_{norm}").lower()
+        with st.container(horizontal=True):
+            clicked = [label for label in commit_labels if st.form_submit_button(label)]
+            prev_page = next_page = False
+            if page_count > 1:
+                prev_page = st.form_submit_button("Previous page", disabled=page == 0)
+                next_page = st.form_submit_button("Next page", disabled=page >= page_count - 1)
+    if prev_page or next_page:
+        pending.update(picks)
+        st.session_state[f"{form_key}_page"] = page + (1 if next_page else -1)
+        st.rerun()
+    if clicked:
+        pending.update(picks)
+        batch = dict(pending)
+        pending.clear()
+        return clicked[0], batch
+    return None, None
+
+def open_speaker_color_editor():
+    """Switch to the full colour editor, starting from the saved colours file."""
+    if os.path.exists(get_saved_colors_file()):
+        with open(get_saved_colors_file(), "r", encoding="utf-8") as f:
+            loaded_colors = json.load(f)
+        set_tracked_state("speaker_colors", loaded_colors)
+        st.session_state.existing_speaker_colors = {normalize_speaker_name(k): v for k, v in loaded_colors.items()}
+    st.session_state.step = "edit_colors"
+    auto_save()
+
 # ---------------------------
 # Restart Helper Function
 # ---------------------------
@@ -2670,36 +3616,6 @@ if st.session_state.step == 1:
                         st.session_state.step = 3
                     else:
                         st.session_state.step = 2
-                    # Ensure frequent-speaker buttons are initialised from quotes before entering Step 2
-                    try:
-                        if st.session_state.get("quotes_lines"):
-                            pattern_speaker = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
-                            counts_cap10 = {}
-                            flagged = set()
-                            for _line in st.session_state.quotes_lines:
-                                m = pattern_speaker.match(_line.strip())
-                                if not m:
-                                    continue
-                                speaker_raw = m.group(1).strip()
-                                effective = smart_title(speaker_raw)
-                                norm = normalize_speaker_name(effective)
-                                if norm in flagged:
-                                    continue
-                                c = counts_cap10.get(norm, 0)
-                                if c < 10:
-                                    c += 1
-                                    counts_cap10[norm] = c
-                                    if c >= 10:
-                                        flagged.add(norm)
-                            st.session_state.speaker_counts = counts_cap10
-                            st.session_state.flagged_names = flagged
-                        else:
-                            if "speaker_counts" not in st.session_state or st.session_state.speaker_counts is None:
-                                st.session_state.speaker_counts = {}
-                            if "flagged_names" not in st.session_state or st.session_state.flagged_names is None:
-                                st.session_state.flagged_names = set()
-                    except Exception:
-                        pass
                     auto_save()
                     st.rerun()
             else:
@@ -2708,7 +3624,8 @@ if st.session_state.step == 1:
                 else:
                     dialogue_list = extract_dialogue_from_docx(st.session_state.book_name, st.session_state.docx_path)
                 st.session_state.quotes_records = build_quotes_records_from_dialogue_list(dialogue_list)
-                st.session_state.quotes_lines = build_quotes_lines_from_records(st.session_state.quotes_records)
+                bump_state_version("quotes_records")
+                sync_quotes_lines_from_records()
                 st.session_state.docx_only = True
                 st.success("Quotes extracted from DOCX.")
                 quotes_txt = "\n".join(dialogue_list)
@@ -2724,36 +3641,6 @@ if st.session_state.step == 1:
                         st.session_state.step = 3
                     else:
                         st.session_state.step = 2
-                    # Ensure frequent-speaker buttons are initialised from quotes before entering Step 2
-                    try:
-                        if st.session_state.get("quotes_lines"):
-                            pattern_speaker = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
-                            counts_cap10 = {}
-                            flagged = set()
-                            for _line in st.session_state.quotes_lines:
-                                m = pattern_speaker.match(_line.strip())
-                                if not m:
-                                    continue
-                                speaker_raw = m.group(1).strip()
-                                effective = smart_title(speaker_raw)
-                                norm = normalize_speaker_name(effective)
-                                if norm in flagged:
-                                    continue
-                                c = counts_cap10.get(norm, 0)
-                                if c < 10:
-                                    c += 1
-                                    counts_cap10[norm] = c
-                                    if c >= 10:
-                                        flagged.add(norm)
-                            st.session_state.speaker_counts = counts_cap10
-                            st.session_state.flagged_names = flagged
-                        else:
-                            if "speaker_counts" not in st.session_state or st.session_state.speaker_counts is None:
-                                st.session_state.speaker_counts = {}
-                            if "flagged_names" not in st.session_state or st.session_state.flagged_names is None:
-                                st.session_state.flagged_names = set()
-                    except Exception:
-                        pass
                     auto_save()
                     st.rerun()
         else:
@@ -2771,19 +3658,21 @@ if st.session_state.step == 1:
                 st.session_state.docx_bytes = docx_file.getvalue()
                 with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_docx:
                     tmp_docx.write(st.session_state.docx_bytes)
-                    st.session_state.docx_path = tmp_docx.name
+                    set_tracked_state("docx_path", tmp_docx.name)
+                clear_step2_prefetch()
                 if speaker_colors_file is not None:
                     raw = json.load(speaker_colors_file)
                     st.session_state.existing_speaker_colors = {normalize_speaker_name(k): v for k, v in raw.items()}
                     save_speaker_colors(st.session_state.existing_speaker_colors)
-                    st.session_state.speaker_colors = st.session_state.existing_speaker_colors.copy()
+                    set_tracked_state("speaker_colors", st.session_state.existing_speaker_colors.copy())
                 else:
                     st.session_state.existing_speaker_colors = {}
-                    st.session_state.speaker_colors = {}
+                    set_tracked_state("speaker_colors", {})
                 if quotes_file is not None:
                     quotes_text = quotes_file.read().decode("utf-8")
-                    st.session_state.quotes_lines = quotes_text.splitlines(keepends=True)
+                    set_tracked_state("quotes_lines", quotes_text.splitlines(keepends=True))
                     st.session_state.quotes_records = build_quotes_records_from_quotes_lines(st.session_state.quotes_lines)
+                    bump_state_version("quotes_records")
                     sync_quotes_lines_from_records()
                     st.session_state.docx_only = False
                     # Persist uploaded quotes to a consistent filename and ensure JSON cache for previews
@@ -2802,8 +3691,9 @@ if st.session_state.step == 1:
                         # Do not fail hard; Step 2 will show 'JSON cache not found yet' if this fails
                         pass
                 else:
-                    st.session_state.quotes_lines = None
+                    set_tracked_state("quotes_lines", None)
                     st.session_state.quotes_records = []
+                    bump_state_version("quotes_records")
                     st.session_state.docx_only = True
                 
                     # Create/overwrite the paragraph JSON once here for docx-only case
@@ -2817,206 +3707,227 @@ if st.session_state.step == 1:
                         st.session_state.step = 3
                     else:
                         st.session_state.step = 2
-                    # Ensure frequent-speaker buttons are initialised from quotes before entering Step 2
-                    try:
-                        if st.session_state.get("quotes_lines"):
-                            pattern_speaker = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
-                            counts_cap10 = {}
-                            flagged = set()
-                            for _line in st.session_state.quotes_lines:
-                                m = pattern_speaker.match(_line.strip())
-                                if not m:
-                                    continue
-                                speaker_raw = m.group(1).strip()
-                                effective = smart_title(speaker_raw)
-                                norm = normalize_speaker_name(effective)
-                                if norm in flagged:
-                                    continue
-                                c = counts_cap10.get(norm, 0)
-                                if c < 10:
-                                    c += 1
-                                    counts_cap10[norm] = c
-                                    if c >= 10:
-                                        flagged.add(norm)
-                            st.session_state.speaker_counts = counts_cap10
-                            st.session_state.flagged_names = flagged
-                        else:
-                            if "speaker_counts" not in st.session_state or st.session_state.speaker_counts is None:
-                                st.session_state.speaker_counts = {}
-                            if "flagged_names" not in st.session_state or st.session_state.flagged_names is None:
-                                st.session_state.flagged_names = set()
-                    except Exception:
-                        pass
                 auto_save()
                 st.rerun()
 
 # ========= STEP 2: Quote Record Review =========
 elif st.session_state.step == 2:
-    ensure_quotes_records_in_session()
     st.markdown("<h4>Step 2: Review Quote Records</h4>", unsafe_allow_html=True)
     st.write("Review each unresolved quote record. Type a speaker, or use 'skip', 'exit', or 'undo'.")
-    if st.button("Auto-populate context for all quote records"):
-        summary = autopopulate_context_for_all_records(st.session_state.get("quotes_records") or [])
-        sync_quotes_lines_from_records()
-        auto_save()
-        st.success(
-            f"Context pass complete: updated {summary['updated']} records "
-            f"({summary['with_context']} with context, {summary['without_context']} without context)."
-        )
 
-    review_index, review_record = get_next_record_for_review(
-        st.session_state.get("quotes_records") or [],
-        st.session_state.get("unknown_index", 0),
-    )
-    if review_index is None or review_record is None:
-        st.write("No more unresolved quote records found.")
-        if st.button("Proceed to Color Assignment"):
-            st.session_state.step = 3
+    # Everything below reruns on its own (st.fragment): submitting a name does not
+    # re-execute the global CSS/font injection or the other steps.
+    @st.fragment
+    def step2_attribution_panel():
+        ensure_quotes_records_in_session()
+        if st.button("Auto-populate context for all quote records"):
+            summary = autopopulate_context_for_all_records(st.session_state.get("quotes_records") or [])
+            bump_state_version("quotes_records")
+            sync_quotes_lines_from_records()
             auto_save()
-            st.rerun()
-    else:
-        dialogue = (review_record.get("quote_with_marks") or review_record.get("quote_text") or "").strip()
-        st.markdown("<hr style='margin: 2px 0;'>", unsafe_allow_html=True)
-        # Using global JSON-only context resolver
-        
-        # Compute occurrence target from all previous lines (quoted-segment aware)
-        occurrence_target = 1
-        start_paragraph_index = 0
-        try:
-            qrecs = st.session_state.get("quotes_records") or []
-            occurrence_target = compute_occurrence_target_for_review(qrecs, review_index)
-            start_paragraph_index = compute_start_paragraph_index_for_review(qrecs, review_index)
-#            st.session_state._dbg_occurrence_target = occurrence_target
-        except Exception:
-            pass
-        context = get_context_for_dialogue_json_only(
-            dialogue,
-            occurrence_target=occurrence_target,
-            start_paragraph_index=start_paragraph_index,
+            st.success(
+                f"Context pass complete: updated {summary['updated']} records "
+                f"({summary['with_context']} with context, {summary['without_context']} without context)."
+            )
+
+        review_index, review_record = get_next_record_for_review(
+            st.session_state.get("quotes_records") or [],
+            st.session_state.get("unknown_index", 0),
         )
-        if context:
-            if "previous" in context:
-                st.markdown(neutralize_markdown_in_html(context["previous"]), unsafe_allow_html=True)
-            st.markdown(neutralize_markdown_in_html(context["current"]), unsafe_allow_html=True)
-#            try:
-#                st.text('DEBUG CMP: curr=' + str(st.session_state.get('_dbg_curr_norm'))
-#                         + ' | prev1=' + str(st.session_state.get('_dbg_prev1_norm'))
-#                         + ' | prev2=' + str(st.session_state.get('_dbg_prev2_norm')))
-#            except Exception:
-#                pass
-
-            if "next" in context:
-                st.markdown(neutralize_markdown_in_html(context["next"]), unsafe_allow_html=True)
+        if review_index is None or review_record is None:
+            st.write("No more unresolved quote records found.")
+            if st.button("Proceed to Color Assignment"):
+                st.session_state.step = 3
+                auto_save()
+                st.rerun()
         else:
-            st.write("No context found in cached JSON for this quote.")
-
-        populate_record_context_fields(review_record, context, occurrence_target)
-
-        st.markdown("<hr style='margin: 2px 0;'>", unsafe_allow_html=True)
-        st.write(f"**Dialogue (Line {review_record.get('index', review_index+1)}):** {dialogue}")
+            dialogue = (review_record.get("quote_with_marks") or review_record.get("quote_text") or "").strip()
+            st.markdown("<hr style='margin: 2px 0;'>", unsafe_allow_html=True)
+            # Using global JSON-only context resolver
         
-        def process_unknown_input(new_speaker: str):
-            new_speaker = new_speaker.strip()
-            if not new_speaker:
-                st.session_state.console_log.insert(0, "Empty input ignored. Enter a name, or use 'skip' / 'exit'.")
-                return
-            if new_speaker.lower() == "exit":
-                st.session_state.console_log.insert(0, "Exiting unknown speaker processing.")
-                st.session_state.step = 3
-            elif new_speaker.lower() == "skip":
-                prev_speaker, new_speaker_value = update_record_speaker(review_record, "", action_type="skip")
-                append_review_event(review_record, "skip", prev_speaker, new_speaker_value)
-                st.session_state.console_log.insert(0, f"Skipped line {review_index+1}.")
-                st.session_state.unknown_index = review_index + 1
-            elif new_speaker.lower() == "undo":
-                if "last_update" in st.session_state and st.session_state.last_update:
-                    last = st.session_state.last_update
-                    last_index = last.get("index")
-                    if last_index is not None and 0 <= last_index < len(st.session_state.get("quotes_records") or []):
-                        st.session_state.quotes_records[last_index].update(last.get("record_snapshot") or {})
-                        st.session_state.unknown_index = last_index
-                        append_review_event(
-                            st.session_state.quotes_records[last_index],
-                            "undo",
-                            last.get("new_speaker"),
-                            last.get("previous_speaker"),
-                        )
-                        st.session_state.console_log.insert(0, f"Reverted line {last_index+1} to previous speaker.")
-                    del st.session_state.last_update
-                else:
-                    st.session_state.console_log.insert(0, "Nothing to undo.")
+            # Compute occurrence target from all previous lines (quoted-segment aware)
+            occurrence_target = 1
+            start_paragraph_index = 0
+            try:
+                qrecs = st.session_state.get("quotes_records") or []
+                occurrence_target = compute_occurrence_target_for_review(qrecs, review_index)
+                start_paragraph_index = compute_start_paragraph_index_for_review(qrecs, review_index)
+    #            st.session_state._dbg_occurrence_target = occurrence_target
+            except Exception:
+                pass
+            paragraphs = None
+            paragraph_key = None
+            try:
+                djson_path = st.session_state.get('d_json_path')
+                if djson_path and os.path.exists(djson_path):
+                    paragraph_key = paragraph_file_key(djson_path)
+                    paragraphs = load_paragraph_cache(djson_path)
+            except Exception:
+                paragraphs = None
+
+            entry = None
+            if paragraphs is not None:
+                entry_key = (paragraph_key, dialogue, occurrence_target, start_paragraph_index)
+                entry = step2_prefetch_get(entry_key)
+                if entry is None:
+                    resolved = resolve_context_paragraph(dialogue, occurrence_target, start_paragraph_index, paragraphs[1])
+                    populate_record_context_fields(review_record, resolved, occurrence_target)
+                    context = get_record_context(review_record)
+                    entry = {"resolved": resolved, "blocks": neutralized_context_blocks(context) if context else []}
+                    step2_prefetch_put(entry_key, entry)
+            populate_record_context_fields(review_record, entry["resolved"] if entry else None, occurrence_target)
+            bump_state_version("quotes_records")
+            if entry and entry["resolved"] is not None:
+                for block in entry["blocks"]:
+                    st.markdown(block, unsafe_allow_html=True)
             else:
-                previous_speaker = review_record.get("speaker_text")
-                st.session_state.last_update = {
-                    "index": review_index,
-                    "record_snapshot": dict(review_record),
-                    "previous_speaker": previous_speaker,
-                    "new_speaker": smart_title(new_speaker),
-                }
-                updated_speaker = smart_title(new_speaker)
-
-                # Increment count for unflagged speakers and flag at 10
-                try:
-                    norm = normalize_speaker_name(updated_speaker)
-                    if "speaker_counts" not in st.session_state or st.session_state.speaker_counts is None:
-                        st.session_state.speaker_counts = {}
-                    if "flagged_names" not in st.session_state or st.session_state.flagged_names is None:
-                        st.session_state.flagged_names = set()
-                    if norm not in st.session_state.flagged_names:
-                        new_cnt = st.session_state.speaker_counts.get(norm, 0) + 1
-                        if new_cnt >= 10:
-                            new_cnt = 10
-                            st.session_state.flagged_names.add(norm)
-                        st.session_state.speaker_counts[norm] = new_cnt
-                except Exception as _e:
-                    pass
-                prev_speaker, new_speaker_value = update_record_speaker(review_record, updated_speaker, action_type="correct")
-                append_review_event(review_record, "correct", prev_speaker, new_speaker_value)
-                st.session_state.console_log.insert(0, f"Updated line {review_index+1} with speaker: {updated_speaker}")
-                st.session_state.unknown_index = review_index + 1
-            sync_quotes_lines_from_records()
-            auto_save()
-            st.rerun()
+                st.write("No context found in cached JSON for this quote.")
+
+            # While this record is on screen, prefetch the next Unknown records. Each lookup
+            # starts from the last paragraph resolved before it, so the worker replays that
+            # chain through the prefetched records in turn.
+            if paragraphs is not None:
+                qrecs = st.session_state.get("quotes_records") or []
+                upcoming = []
+                first_start = 0
+                for j in range(review_index + 1, len(qrecs)):
+                    rec_j = qrecs[j] or {}
+                    pidx_j = rec_j.get("paragraph_index")
+                    pidx_j = pidx_j if isinstance(pidx_j, int) and pidx_j >= 0 else None
+                    if (rec_j.get("speaker_text") or "").strip().lower() == "unknown":
+                        if not upcoming:
+                            # The record shown now is already populated, so this is exact.
+                            first_start = compute_start_paragraph_index_for_review(qrecs, j)
+                        upcoming.append({
+                            "dialogue": (rec_j.get("quote_with_marks") or rec_j.get("quote_text") or "").strip(),
+                            "occurrence_target": compute_occurrence_target_for_review(qrecs, j),
+                            "paragraph_index": pidx_j,
+                            "between_last": None,  # last paragraph_index among the records up to the next Unknown
+                        })
+                        if len(upcoming) >= STEP2_PREFETCH_AHEAD:
+                            break
+                    elif upcoming and pidx_j is not None:
+                        upcoming[-1]["between_last"] = pidx_j
+
+                def prefetch_jobs(paragraphs_html, plain_paras, paragraph_key, start):
+                    # Runs on the prefetch worker: no Streamlit calls.
+                    for item in upcoming:
+                        resolved_j = resolve_context_paragraph(item["dialogue"], item["occurrence_target"], start, plain_paras)
+
+                        def build(resolved_j=resolved_j):
+                            if resolved_j is None:
+                                return {"resolved": None, "blocks": []}
+                            ctx = build_context_for_paragraph(paragraphs_html, *resolved_j)
+                            return {"resolved": resolved_j, "blocks": neutralized_context_blocks(ctx)}
+
+                        yield (paragraph_key, item["dialogue"], item["occurrence_target"], start), build
+                        if resolved_j is not None:
+                            start = resolved_j[0]
+                        elif item["paragraph_index"] is not None:
+                            start = item["paragraph_index"]
+                        if item["between_last"] is not None:
+                            start = item["between_last"]
+
+                if upcoming:
+                    start_step2_prefetch(prefetch_jobs(paragraphs[0], paragraphs[1], paragraph_key, first_start))
+
+            st.markdown("<hr style='margin: 2px 0;'>", unsafe_allow_html=True)
+            st.write(f"**Dialogue (Line {review_record.get('index', review_index+1)}):** {dialogue}")
         
-        # --- New: one‑submit‑per‑name form -------------------------------
+            def process_unknown_input(new_speaker: str):
+                new_speaker = new_speaker.strip()
+                if not new_speaker:
+                    st.session_state.console_log.insert(0, "Empty input ignored. Enter a name, or use 'skip' / 'exit'.")
+                    return
+                if new_speaker.lower() == "exit":
+                    st.session_state.console_log.insert(0, "Exiting unknown speaker processing.")
+                    st.session_state.step = 3
+                elif new_speaker.lower() == "skip":
+                    prev_speaker, new_speaker_value = update_record_speaker(review_record, "", action_type="skip")
+                    append_review_event(review_record, "skip", prev_speaker, new_speaker_value)
+                    st.session_state.console_log.insert(0, f"Skipped line {review_index+1}.")
+                    st.session_state.unknown_index = review_index + 1
+                elif new_speaker.lower() == "undo":
+                    clear_step2_prefetch()
+                    if "last_update" in st.session_state and st.session_state.last_update:
+                        last = st.session_state.last_update
+                        last_index = last.get("index")
+                        if last_index is not None and 0 <= last_index < len(st.session_state.get("quotes_records") or []):
+                            st.session_state.quotes_records[last_index].update(last.get("record_snapshot") or {})
+                            mark_record_dirty(st.session_state.quotes_records[last_index])
+                            st.session_state.unknown_index = last_index
+                            append_review_event(
+                                st.session_state.quotes_records[last_index],
+                                "undo",
+                                last.get("new_speaker"),
+                                last.get("previous_speaker"),
+                            )
+                            st.session_state.console_log.insert(0, f"Reverted line {last_index+1} to previous speaker.")
+                        del st.session_state.last_update
+                    else:
+                        st.session_state.console_log.insert(0, "Nothing to undo.")
+                else:
+                    previous_speaker = review_record.get("speaker_text")
+                    st.session_state.last_update = {
+                        "index": review_index,
+                        "record_snapshot": dict(review_record),
+                        "previous_speaker": previous_speaker,
+                        "new_speaker": smart_title(new_speaker),
+                    }
+                    updated_speaker = smart_title(new_speaker)
+
+                    prev_speaker, new_speaker_value = update_record_speaker(review_record, updated_speaker, action_type="correct")
+                    append_review_event(review_record, "correct", prev_speaker, new_speaker_value)
+                    st.session_state.console_log.insert(0, f"Updated line {review_index+1} with speaker: {updated_speaker}")
+                    st.session_state.unknown_index = review_index + 1
+                bump_state_version("quotes_records")
+                sync_quotes_lines_from_records()
+                auto_save()
+                if st.session_state.step != 2:
+                    st.rerun()
+                rerun_step2_panel()
+        
+            # --- New: one‑submit‑per‑name form -------------------------------
 
-        # Frequent speakers (flagged, alphabetical). Buttons act like typing + Enter.
-        try:
-            if "flagged_names" in st.session_state and st.session_state.flagged_names:
-                flagged_sorted = sorted(st.session_state.flagged_names)
-                flagged_sorted = [n for n in flagged_sorted if n.lower() != "unknown"]
-                st.caption("Frequent speakers:")
-                with st.container(horizontal=True):
-                    cmap = st.session_state.get("canonical_map") or {}
-                    for i, norm in enumerate(flagged_sorted):
-                        display_name = cmap.get(norm, norm.title())
-                        if st.button(display_name, key=f"flagged_{norm}"):
-                            process_unknown_input(display_name)
-        except Exception as _e:
-            pass
-        with st.form("unknown_form", clear_on_submit=True):
-            new_name = st.text_input(
-                "Enter speaker name (or 'skip'/'exit'/'undo'):",
-                key="new_speaker_input",
-                placeholder="Type name and press Enter",
-            )
+            # Frequent speakers (flagged, alphabetical). Buttons act like typing + Enter.
+            try:
+                stats = get_speaker_stats()
+                flagged_sorted = frequent_speakers(stats)
+                if flagged_sorted:
+                    st.caption("Frequent speakers:")
+                    with st.container(horizontal=True):
+                        cmap = st.session_state.get("canonical_map") or {}
+                        for i, norm in enumerate(flagged_sorted):
+                            display_name = cmap.get(norm) or speaker_display_name(stats, norm)
+                            if st.button(display_name, key=f"flagged_{norm}"):
+                                process_unknown_input(display_name)
+            except Exception as _e:
+                pass
+            with st.form("unknown_form", clear_on_submit=True):
+                new_name = st.text_input(
+                    "Enter speaker name (or 'skip'/'exit'/'undo'):",
+                    key="new_speaker_input",
+                    placeholder="Type name and press Enter",
+                )
         
-            # Evenly spaced horizontal buttons
-            with st.container(horizontal=True):
-                submitted    = st.form_submit_button("Submit")
-                skip_clicked = st.form_submit_button("Skip")
-                exit_clicked = st.form_submit_button("Exit")
-                undo_clicked = st.form_submit_button("Undo (max 1)")
-        if submitted:
-            process_unknown_input(new_name)
-        elif skip_clicked:
-            process_unknown_input("skip")
-        elif exit_clicked:
-            process_unknown_input("exit")
-        elif undo_clicked:
-            process_unknown_input("undo")
+                # Evenly spaced horizontal buttons
+                with st.container(horizontal=True):
+                    submitted    = st.form_submit_button("Submit")
+                    skip_clicked = st.form_submit_button("Skip")
+                    exit_clicked = st.form_submit_button("Exit")
+                    undo_clicked = st.form_submit_button("Undo (max 1)")
+            if submitted:
+                process_unknown_input(new_name)
+            elif skip_clicked:
+                process_unknown_input("skip")
+            elif exit_clicked:
+                process_unknown_input("exit")
+            elif undo_clicked:
+                process_unknown_input("undo")
           
-        st.text_area("Console Log", "\n".join(st.session_state.console_log), height=150, label_visibility="collapsed")
+            st.text_area("Console Log", "\n".join(st.session_state.console_log), height=150, label_visibility="collapsed")
+
+    step2_attribution_panel()
 
 # ========= STEP 3: Speaker Color Assignment =========
 elif st.session_state.step == 3:
@@ -3024,14 +3935,21 @@ elif st.session_state.step == 3:
     st.markdown("<h4>Step 3: Speaker Color Assignment</h4>", unsafe_allow_html=True)
     st.write("Assign highlight colors for speakers that do not yet have an assigned color. You can also click 'Edit Speaker Colors' to review and change all assignments.")
     # Load the canonical speakers.
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode="w+", encoding="utf-8") as tmp_quotes:
-        tmp_quotes.write("".join(st.session_state.quotes_lines))
-        tmp_quotes_path = tmp_quotes.name
-    canonical_speakers, canonical_map = get_canonical_speakers(tmp_quotes_path)
-    st.session_state.canonical_map = canonical_map
+    canonical_speakers, canonical_map = get_canonical_speakers()
+    set_tracked_state("canonical_map", canonical_map)
     # Load existing colors (or default to empty dict)
     existing_colors = st.session_state.get("existing_speaker_colors") or load_existing_colors() or {}
-    
+    # 'Unknown' and 'Do Not Read' always keep their fixed colours (saved with the next commit).
+    fixed_colors = {
+        normalize_speaker_name(sp): "none" if sp.lower() == "unknown" else "do not read"
+        for sp in canonical_speakers if sp.lower() in ("unknown", "do not read")
+    }
+    set_tracked_state("speaker_colors", {**(st.session_state.get("speaker_colors") or {}), **fixed_colors})
+
+    notice = st.session_state.pop("step3_notice", None)
+    if notice:
+        st.success(notice)
+
     # Determine which speakers need a new assignment
     speakers_to_assign = [
         sp for sp in canonical_speakers 
@@ -3040,177 +3958,154 @@ elif st.session_state.step == 3:
     
     if speakers_to_assign:
         st.write("Assign colors to the following speakers:")
-        color_options = [color.title() for color in COLOR_PALETTE.keys() if color.lower() != "do not read"]
-        updated_colors = {}
-        for sp in speakers_to_assign:
-            norm = normalize_speaker_name(sp)
-            default_color = existing_colors.get(norm, "none")
-            try:
-                default_index = color_options.index(default_color.title())
-            except ValueError:
-                default_index   = color_options.index("None")
-            selected = st.selectbox(sp, options=color_options, index=default_index, key="new_"+norm)
-            updated_colors[norm] = selected.lower()
-        # Merge updated colors with any already assigned values.
-        for norm, col in updated_colors.items():
-            existing_colors[norm] = col
-        # Build final dictionary using normalized keys.
-        final_colors = {}
-        for sp in canonical_speakers:
-            norm = normalize_speaker_name(sp)
-            if sp.lower() == "unknown":
-                final_colors[norm] = "none"
-            elif sp.lower() == "do not read":
-                final_colors[norm] = "do not read"
-            else:
-                final_colors[norm] = existing_colors.get(norm, "none")
-        st.session_state.speaker_colors = final_colors
-        st.session_state.existing_speaker_colors = existing_colors.copy()
-        save_speaker_colors(final_colors)
-        st.success("Speaker colors updated.")
-    else:
-        st.write("All speakers already have assigned colors.")
-    if os.path.exists(get_saved_colors_file()):
-        with open(get_saved_colors_file(), "r", encoding="utf-8") as f:
-            loaded_colors = json.load(f)
-        st.session_state.speaker_colors = loaded_colors
-        st.session_state.existing_speaker_colors = {normalize_speaker_name(k): v for k, v in loaded_colors.items()}
-    else:
-        st.session_state.speaker_colors = {}
-        st.session_state.existing_speaker_colors = {}
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("Continue"):
-            st.session_state.step = 4
-            auto_save()
+        if st.button("Auto-assign colors by line count", help="Give every speaker below a distinct palette color, busiest speakers first."):
+            picks = auto_assign_colors(speakers_to_assign, st.session_state.speaker_colors, get_speaker_stats()["counts"])
+            commit_speaker_colors({**fixed_colors, **picks})
+            st.session_state.pop("step3_colors_pending", None)
+            st.session_state.step3_notice = f"Auto-assigned colors to {len(picks)} speakers."
             st.rerun()
-    with col2:
-        if st.button("Edit Speaker Colors"):
-            if os.path.exists(get_saved_colors_file()):
-                with open(get_saved_colors_file(), "r", encoding="utf-8") as f:
-                    loaded_colors = json.load(f)
-                st.session_state.speaker_colors = loaded_colors
-                st.session_state.existing_speaker_colors = {normalize_speaker_name(k): v for k, v in loaded_colors.items()}
-            st.session_state.step = "edit_colors"
-            auto_save()
+        # Leaving the step goes through the form, so picks on any page are never dropped.
+        action, picks = speaker_color_form(
+            "step3_colors", speakers_to_assign, existing_colors,
+            ("Save Colors", "Save and Continue", "Save and Edit All Colors"),
+        )
+        if action:
+            changed = commit_speaker_colors({**fixed_colors, **picks})
+            st.session_state.step3_notice = f"Speaker colors updated ({len(changed)} changed)."
+            if action == "Save and Continue":
+                st.session_state.step = 4
+                auto_save()
+            elif action == "Save and Edit All Colors":
+                open_speaker_color_editor()
             st.rerun()
+    else:
+        st.write("All speakers already have assigned colors.")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Continue"):
+                st.session_state.step = 4
+                auto_save()
+                st.rerun()
+        with col2:
+            if st.button("Edit Speaker Colors"):
+                open_speaker_color_editor()
+                st.rerun()
 
 # ========= EDIT COLORS: Full Speaker Color Assignment =========
 elif st.session_state.step == "edit_colors":
     ensure_quotes_records_in_session()
     st.markdown("<h4>Edit Speaker Colors</h4>", unsafe_allow_html=True)
     st.write("Edit the assigned colors for all speakers (excluding 'Unknown'):")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode="w+", encoding="utf-8") as tmp_quotes:
-        tmp_quotes.write("".join(st.session_state.quotes_lines))
-        tmp_quotes_path = tmp_quotes.name
-    canonical_speakers, canonical_map = get_canonical_speakers(tmp_quotes_path)
-    st.session_state.canonical_map = canonical_map
+    canonical_speakers, canonical_map = get_canonical_speakers()
+    set_tracked_state("canonical_map", canonical_map)
     # Load current colors (or default to empty)
     existing_colors = st.session_state.get("speaker_colors") or load_existing_colors() or {}
-    updated_colors = existing_colors.copy()
-    color_options = [color.title() for color in COLOR_PALETTE.keys() if color.lower() != "do not read"]
-    for sp in canonical_speakers:
-        if sp.lower() in ("unknown", "do not read"):
-            continue
-        norm = normalize_speaker_name(sp)
-        default_color = existing_colors.get(norm, "none")
-        try:
-            default_index = color_options.index(default_color.title())
-        except ValueError:
-            default_index = color_options.index("None")
-        selected = st.selectbox(sp, options=color_options, index=default_index, key="edit_"+norm)
-        updated_colors[norm] = selected.lower()
-    st.session_state.speaker_colors = updated_colors
-    st.session_state.existing_speaker_colors = updated_colors.copy()
-    save_speaker_colors(updated_colors)
-    st.success("Speaker colors updated.")
-    if st.button("Continue"):
-        st.session_state.step = 4
-        auto_save()
+    existing_colors = {normalize_speaker_name(k): v for k, v in existing_colors.items()}
+    notice = st.session_state.pop("step3_notice", None)
+    if notice:
+        st.success(notice)
+    editable_speakers = [sp for sp in canonical_speakers if sp.lower() not in ("unknown", "do not read")]
+    # Continuing goes through the form's "Save and Continue", so no pick is dropped.
+    action, picks = speaker_color_form("edit_colors", editable_speakers, existing_colors, ("Save Colors", "Save and Continue"))
+    if action:
+        changed = commit_speaker_colors(picks)
+        st.session_state.step3_notice = f"Speaker colors updated ({len(changed)} changed)."
+        if action == "Save and Continue":
+            st.session_state.step = 4
+            auto_save()
         st.rerun()
 
 # ========= STEP 4: Final HTML Generation =========
 elif st.session_state.step == 4:
     ensure_quotes_records_in_session()
     if "speaker_colors" not in st.session_state or st.session_state.speaker_colors is None:
-        st.session_state.speaker_colors = load_existing_colors() or {}
+        set_tracked_state("speaker_colors", load_existing_colors() or {})
     st.markdown("<h4>Step 4: Final HTML Generation</h4>", unsafe_allow_html=True)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode="w+", encoding="utf-8") as tmp_quotes:
-        tmp_quotes.write("".join(st.session_state.quotes_lines))
-        quotes_file_path = tmp_quotes.name
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_marker:
-        marker_docx_path = tmp_marker.name
-    create_marker_docx(st.session_state.docx_path, marker_docx_path)
-    html = convert_docx_to_html_mammoth(marker_docx_path)
-    os.remove(marker_docx_path)
-    quotes_list = load_quotes(quotes_file_path, st.session_state.canonical_map)
-    highlighted_html = highlight_dialogue_in_html(html, quotes_list, st.session_state.speaker_colors)
-    final_html_body = apply_manual_indentation_with_markers(st.session_state.docx_path, highlighted_html)
-    if st.session_state.get("content_type", "Book") == "Script":
-        final_html_body = transform_script_layout(final_html_body)
-    summary_html = generate_summary_html(quotes_list, list(st.session_state.canonical_map.values()), st.session_state.speaker_colors)
-    ranking_html = generate_ranking_html(quotes_list, st.session_state.speaker_colors)
-    first_lines_html = generate_first_lines_html(quotes_list, list(st.session_state.canonical_map.values()))
+    # The rendered body is cached per input state; paging through the preview and
+    # clicking downloads only re-serve slices of it instead of re-rendering the book.
+    render_key = compute_step4_render_key()
+    render = st.session_state.get("step4_render")
+    if not render or render.get("key") != render_key:
+        converted = convert_docx_for_step4(docx_content_hash(st.session_state.docx_path), st.session_state.docx_path)
+        quotes_list = load_quotes(st.session_state.quotes_lines, st.session_state.canonical_map)
+        body_pages = render_step4_body(
+            converted["html"],
+            converted["indented_paras"],
+            quotes_list,
+            st.session_state.get("content_type", "Book"),
+            candidate_texts=converted["candidate_texts"],
+        )
+        # The reports only depend on who speaks which lines, so a DOCX or content-type
+        # change that re-renders the body reuses them.
+        reports_key = state_version("quotes_lines", "canonical_map")
+        reports = st.session_state.get("step4_reports")
+        if not reports or reports["key"] != reports_key:
+            reports = {
+                "key": reports_key,
+                "html": build_reports_html(quotes_list, list(st.session_state.canonical_map.values())),
+            }
+            st.session_state.step4_reports = reports
+        render = {
+            "key": render_key,
+            "speakers": list(dict.fromkeys([q["speaker"] for q in quotes_list] + list(st.session_state.canonical_map.values()))),
+            "pages": [{"title": "Character Summary & Reports", "html": reports["html"]}] + body_pages,
+            "unmatched_count": st.session_state.get("unmatched_quotes_count", 0),
+        }
+        st.session_state.step4_render = render
+        st.session_state.preview_page = 0
+    elif render.get("unmatched_count"):
+        st.write(f"⚠️ Unmatched quotes saved to '[userkey]-unmatched_quotes.txt' ({render['unmatched_count']} entries)")
+    # Re-colouring only regenerates the speaker stylesheet, not the highlighted body.
+    speaker_css_key = state_version("speaker_colors", "quotes_lines", "canonical_map")
+    if render.get("speaker_css_key") != speaker_css_key:
+        render["speaker_css"] = build_speaker_stylesheet(render["speakers"], st.session_state.speaker_colors)
+        render["speaker_css_key"] = speaker_css_key
     fontsel = normalize_font_family(st.session_state.get("fontsel", "Avenir"))
-    font_face_html = build_font_face_css(fontsel, embed_base64=True)
-    final_html_body = summary_html + "\n<br><br><br>\n" + ranking_html + "\n<br><br><br>\n" + first_lines_html + "\n" + final_html_body
-    final_html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>{st.session_state.book_name}</title>
-  <style>
-    {font_face_html}
-    body {{
-      font-family: '{fontsel}', sans-serif;
-      line-height: 2;
-      max-width: 500px;
-      margin: auto;
-    }}
-    span {{
-      padding: 0;
-    }}
-    span.highlight {{
-      background-color: var(--highlight-color, transparent);
-      padding: 0.33em 0px;
-      box-decoration-break: clone;
-      -webkit-box-decoration-break: clone;
-    }}
-
-    /* Script layout */
-    p.script-line {{
-      margin-left: 0;
-      text-indent: 0;
-      display: grid;
-      grid-template-columns: 9em 1fr;  /* fixed speaker column width */
-      column-gap: 0.75em;
-    }}
-    .script-speaker {{
-      font-weight: bold;
-    }}
-    .script-dialogue {{
-      /* dialogue automatically takes remaining space in the second column */
-    }}
-
-  </style>
-</head>
-<body>
-{final_html_body}
-</body>
-</html>
-"""
-    final_html_path = os.path.join(tempfile.gettempdir(), f"{st.session_state.book_name}.html")
-    with open(final_html_path, "w", encoding="utf-8") as f:
-        f.write(final_html)
+    book_name = st.session_state.book_name
     st.success("Final HTML generated.")
-    components.html(final_html, height=800, scrolling=True)
-    with open(final_html_path, "rb") as f:
-        html_bytes = f.read()
-    st.download_button("Download HTML File", html_bytes,
-                       file_name=f"{st.session_state.userkey}-{st.session_state.book_name}.html", mime="text/html")
+
+    # Windowed preview: only the selected chapter-sized page is sent to the browser.
+    pages = render["pages"]
+    page_count = len(pages)
+    if not isinstance(st.session_state.get("preview_page"), int) or not 0 <= st.session_state.preview_page < page_count:
+        st.session_state.preview_page = 0
+    nav_prev, nav_select, nav_next = st.columns([1, 4, 1], vertical_alignment="bottom")
+    with nav_prev:
+        st.button("Previous", key="preview_prev", on_click=shift_preview_page, args=(-1, page_count),
+                  disabled=st.session_state.preview_page <= 0)
+    with nav_select:
+        st.selectbox("Preview section", options=list(range(page_count)),
+                     format_func=lambda i: pages[i]["title"], key="preview_page")
+    with nav_next:
+        st.button("Next", key="preview_next", on_click=shift_preview_page, args=(1, page_count),
+                  disabled=st.session_state.preview_page >= page_count - 1)
+    with st.container(height=800):
+        st.html(build_preview_page_html(pages[st.session_state.preview_page]["html"], fontsel, render["speaker_css"]))
+
+    # Every export below is built lazily when its download button is clicked and memoized
+    # against the version of the state it is derived from, so opening Step 4 (or paging the
+    # preview) pays for none of them. Builders capture plain values up front because deferred
+    # downloads run outside the script thread and cannot read st.session_state.
+    userkey = st.session_state.userkey
+    speaker_colors = st.session_state.speaker_colors
+    quotes_lines = st.session_state.quotes_lines
+    docx_path = st.session_state.docx_path
+    content_type = st.session_state.get("content_type", "Book")
+    canonical_map = st.session_state.get("canonical_map") or {}
+    unmatched_quotes_filename = get_unmatched_quotes_filename()
+    lines_csv_filename = get_lines_csv_filename()
+    speaker_css = render["speaker_css"]
+    final_html_version = (render_key, speaker_css_key, fontsel)
+
+    # The full document (with Base64 fonts) is only assembled when a download is requested.
+    def _make_final_html() -> str:
+        return build_final_html(book_name, fontsel, speaker_css, "".join(page["html"] for page in pages))
+
+    st.download_button("Download HTML File",
+                       data=lazy_artifact("html", final_html_version, lambda: _make_final_html().encode("utf-8")),
+                       file_name=f"{userkey}-{book_name}.html", mime="text/html")
     # --- PDF export (optional) ---
-    pdf_file_name = f"{st.session_state.userkey}-{st.session_state.book_name}.pdf"
+    pdf_file_name = f"{userkey}-{book_name}.pdf"
 
     # Only *check* availability during Step 4 render (fast). Actual PDF generation happens on-click.
     pdf_available = True
@@ -3225,12 +4120,12 @@ elif st.session_state.step == 4:
         def _make_pdf() -> bytes:
             # Streamlit can lazily call this when the download button is clicked (newer versions).
             # For older Streamlit versions (no callable support), we fall back below.
-            return render_html_to_pdf_bytes(final_html, base_url=os.path.dirname(final_html_path))
+            return render_html_to_pdf_bytes(_make_final_html(), base_url=tempfile.gettempdir())
 
         try:
             st.download_button(
                 "Download PDF File (takes a while!)",
-                data=_make_pdf,  # lazy / on-click generation (Streamlit >= supports callable)
+                data=lazy_artifact("pdf", final_html_version, _make_pdf),  # lazy / on-click generation (Streamlit >= supports callable)
                 file_name=pdf_file_name,
                 mime="application/pdf",
             )
@@ -3267,77 +4162,61 @@ elif st.session_state.step == 4:
             f"Details: {pdf_import_error}"
         )
 
-    updated_colors = json.dumps(st.session_state.speaker_colors, indent=4, ensure_ascii=False).encode("utf-8")
-    st.download_button("Download Updated Speaker Colors JSON", updated_colors,
-                       file_name=f"{st.session_state.userkey}-speaker_colors.json", mime="application/json")
-    updated_quotes = "".join(st.session_state.quotes_lines).encode("utf-8")
-    st.download_button("Download Updated Quotes TXT", updated_quotes,
-                       file_name=f"{st.session_state.userkey}-{st.session_state.book_name}-quotes.txt", mime="text/plain")
+    st.download_button("Download Updated Speaker Colors JSON",
+                       data=lazy_artifact("speaker_colors", state_version("speaker_colors"),
+                                          lambda: json.dumps(speaker_colors, indent=4, ensure_ascii=False).encode("utf-8")),
+                       file_name=f"{userkey}-speaker_colors.json", mime="application/json")
+    st.download_button("Download Updated Quotes TXT",
+                       data=lazy_artifact("quotes_txt", state_version("quotes_lines"),
+                                          lambda: "".join(quotes_lines).encode("utf-8")),
+                       file_name=f"{userkey}-{book_name}-quotes.txt", mime="text/plain")
     quotes_records_payload = st.session_state.get("quotes_records") or []
-    quotes_records_bytes = json.dumps(quotes_records_payload, indent=2, ensure_ascii=False).encode("utf-8")
     st.download_button(
         "Download Quotes Records JSON",
-        quotes_records_bytes,
-        file_name=f"{st.session_state.userkey}-{st.session_state.book_name}-quotes-records.json",
+        data=lazy_artifact("quotes_records", state_version("quotes_records", "quotes_lines"),
+                           lambda: json.dumps(quotes_records_payload, indent=2, ensure_ascii=False).encode("utf-8")),
+        file_name=f"{userkey}-{book_name}-quotes-records.json",
         mime="application/json",
     )
-    # Lines CSV export (eager generation; lightweight and avoids Streamlit context issues in deferred callables)
-    csv_bytes = build_csv_from_docx_json_and_quotes()
+    # The CSV is streamed to disk and memoized by path; the download hands
+    # Streamlit an open handle on the click instead of reading the file here.
+    def _write_lines_csv():
+        return write_lines_csv(lines_csv_filename, quotes_lines, docx_path, content_type, canonical_map)
+    lines_csv_path = lazy_artifact(
+        "lines_csv",
+        state_version("quotes_lines", "canonical_map", "docx_path", "content_type"),
+        _write_lines_csv,
+    )
+    def _open_lines_csv():
+        path = lines_csv_path()
+        if not os.path.exists(path):
+            path = _write_lines_csv()
+        return open(path, "rb")
     st.download_button(
         "Download Lines CSV",
-        csv_bytes,
-        file_name=f"{st.session_state.userkey}-{st.session_state.book_name}-lines.csv",
+        data=_open_lines_csv,
+        file_name=f"{userkey}-{book_name}-lines.csv",
         mime="text/csv",
     )
-    if os.path.exists(get_unmatched_quotes_filename()):
-        with open(get_unmatched_quotes_filename(), "rb") as f:
-            unmatched_bytes = f.read()
-        st.download_button("Download Unmatched Quotes TXT", unmatched_bytes,
-                           file_name=get_unmatched_quotes_filename(), mime="text/plain")
+    if os.path.exists(unmatched_quotes_filename):
+        st.download_button("Download Unmatched Quotes TXT",
+                           data=lambda: open(unmatched_quotes_filename, "rb"),
+                           file_name=unmatched_quotes_filename, mime="text/plain")
     if st.button("Return to Step 2"):
         if "book_name" in st.session_state:
             quotes_filename = f"{st.session_state.userkey}-{st.session_state.book_name}-quotes.txt"
             if os.path.exists(quotes_filename):
                 with open(quotes_filename, "r", encoding="utf-8") as f:
-                    st.session_state.quotes_lines = f.read().splitlines(keepends=True)
+                    set_tracked_state("quotes_lines", f.read().splitlines(keepends=True))
                 st.session_state.quotes_records = build_quotes_records_from_quotes_lines(st.session_state.quotes_lines)
+                bump_state_version("quotes_records")
                 sync_quotes_lines_from_records()
         if os.path.exists(f"{st.session_state.userkey}-speaker_colors.json"):
             with open(f"{st.session_state.userkey}-speaker_colors.json", "r", encoding="utf-8") as f:
                 colors = json.load(f)
-            st.session_state.speaker_colors = colors
+            set_tracked_state("speaker_colors", colors)
             st.session_state.existing_speaker_colors = {normalize_speaker_name(k): v for k, v in colors.items()}
         st.session_state.step = 2
-        # Ensure frequent-speaker buttons are initialised from quotes before entering Step 2
-        try:
-            if st.session_state.get("quotes_lines"):
-                pattern_speaker = re.compile(r"^\s*\d+(?:[a-zA-Z]+)?\.\s+([^:]+):")
-                counts_cap10 = {}
-                flagged = set()
-                for _line in st.session_state.quotes_lines:
-                    m = pattern_speaker.match(_line.strip())
-                    if not m:
-                        continue
-                    speaker_raw = m.group(1).strip()
-                    effective = smart_title(speaker_raw)
-                    norm = normalize_speaker_name(effective)
-                    if norm in flagged:
-                        continue
-                    c = counts_cap10.get(norm, 0)
-                    if c < 10:
-                        c += 1
-                        counts_cap10[norm] = c
-                        if c >= 10:
-                            flagged.add(norm)
-                st.session_state.speaker_counts = counts_cap10
-                st.session_state.flagged_names = flagged
-            else:
-                if "speaker_counts" not in st.session_state or st.session_state.speaker_counts is None:
-                    st.session_state.speaker_counts = {}
-                if "flagged_names" not in st.session_state or st.session_state.flagged_names is None:
-                    st.session_state.flagged_names = set()
-        except Exception:
-            pass
         auto_save()
         st.rerun() 
         # Add a Clear Cache button below "Return to Step 2"
@@ -3347,6 +4226,7 @@ elif st.session_state.step == 4:
             get_progress_file(),
             get_saved_colors_file(),
             get_unmatched_quotes_filename(),
+            get_lines_csv_filename(),
             f"{st.session_state.userkey}-{st.session_state.book_name}-quotes.txt",
             f"{st.session_state.userkey}-{st.session_state.book_name}.html",
             f"{st.session_state.userkey}-{st.session_state.book_name}.json"
@@ -3362,7 +4242,8 @@ elif st.session_state.step == 4:
         keys_to_clear = [
             "step", "userkey", "docx_bytes", "docx_path", "book_name",
             "quotes_lines", "speaker_colors", "existing_speaker_colors",
-            "unknown_index", "console_log", "canonical_map", "last_update"
+            "unknown_index", "paragraph_cursor", "console_log", "canonical_map", "last_update", "speaker_stats",
+            "quotes_records_dirty", "quotes_records_synced", "step4_render", "step4_reports", "step2_prefetch", "preview_page", "step3_colors_pending", "edit_colors_pending", "step3_colors_page", "edit_colors_page", "state_versions", "artifact_cache"
         ]
         for k in keys_to_clear:
             if k in st.session_state:
@@ -0,0 +1,30 @@
+"""Load the app modules for testing.
+
+Both apps are Streamlit scripts, so only their imports, function definitions and
+module-level constants are executed; the UI body never runs.
+"""
+import ast
+import functools
+import pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+APPS = ["streamlit_dialogue.py", "streamlit_dialogue_test.py"]
+
+
+@functools.lru_cache(maxsize=None)
+def load_app(name):
+    path = ROOT / name
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+
+    def is_constant(node):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return all(isinstance(t, ast.Name) and (t.id.isupper() or t.id.startswith("_")) for t in targets)
+
+    body = [
+        node for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef))
+        or (isinstance(node, (ast.Assign, ast.AnnAssign)) and is_constant(node))
+    ]
+    namespace = {"__name__": f"app_{path.stem}", "__file__": str(path)}
+    exec(compile(ast.Module(body=body, type_ignores=[]), str(path), "exec"), namespace)
+    return namespace
@@ -0,0 +1,87 @@
+"""Differential tests for the lxml parsing fast path against html.parser."""
+import re
+
+import pytest
+
+from conftest import APPS, load_app
+
+pytest.importorskip("lxml")
+
+
+@pytest.fixture(scope="module", params=APPS)
+def app(request):
+    return load_app(request.param)
+
+
+# Paragraph JSON entries as build_d_paragraphs_html writes them: escaped run text
+# wrapped in <b>/<i>/<u>, including whitespace-only runs and stray control characters.
+PARAGRAPHS = [
+    "Plain narration with no markup at all.",
+    "Tom &amp; Jerry said &quot;hi&quot; &lt;loudly&gt; &#x27;twice&#x27;.",
+    "<b>Pixel:</b> “Where are you going?” she asked.",
+    "He paused<i>…</i> then <b><i><u>ran</u></i></b>.",
+    "“Wait,” <b> </b>she said.<i>\t</i>“Don’t go.”",
+    "<b>Bold</b>\n<i>line two</i>\nline three",
+    "Non breaking space and a thin space.",
+    "  leading and trailing whitespace  ",
+    "<i> </i>",
+    " <b>x</b> ",
+    "\x0bVertical tab before the first run <b>bold</b>",
+    "\x01<b>start of heading</b> then text",
+    "Group\x1cseparator <i>inside</i> a paragraph",
+    "<b>form\x0cfeed</b> and a NUL\x00 byte",
+    "Tab\tand\r\ncarriage return <u>kept</u>",
+]
+
+# Step 4 bodies as Mammoth produces them.
+DOCUMENTS = [
+    "<h1>Chapter One</h1><p>“Hello there,” said Alice.</p><p>Bob replied, “Hi.”</p>",
+    "<p><strong>Alice:</strong> “Is it <em>really</em> you?”</p>\n<p> </p><p>“It is,” said Bob.</p>",
+    "<ul><li>“One,” she counted.</li><li>“Two.”</li></ul><p>Tom &amp; Jerry: “Three!”</p>",
+    "<p><a id=\"para-0\"></a>“Hello there,” said Alice.<br />“Again,” she said.</p>",
+    "<p>\x0b“Hello there,” said Alice.</p><p>Bob\x1c replied, “Hi.”</p>",
+]
+QUOTES = [
+    "1. Alice: “Hello there,”\n",
+    "2. Bob: “Hi.”\n",
+    "3. Alice: “Is it really you?”\n",
+    "4. Bob: “It is,”\n",
+    "5. Carol: “One,”\n",
+    "6. Carol: “Two.”\n",
+    "7. Tom: “Three!”\n",
+    "8. Alice: “Again,”\n",
+]
+
+
+@pytest.mark.parametrize("markup", PARAGRAPHS)
+def test_html_to_text_matches_html_parser(app, markup):
+    reference = app["html_to_text"](markup, parser="html.parser")
+    fast = app["html_to_text"](markup, parser="lxml")
+    # Matching and context lookup only ever see normalised text.
+    assert app["normalize_text"](fast) == app["normalize_text"](reference)
+    if app["_HTML_CONTROL_CHAR_RE"].search(markup):
+        assert fast == reference
+
+
+@pytest.mark.parametrize("markup", PARAGRAPHS)
+def test_html_to_text_never_returns_markup(app, markup):
+    text = app["html_to_text"](markup, parser="lxml")
+    assert not re.search(r"</?[biu]>", text)
+
+
+@pytest.mark.parametrize("markup", PARAGRAPHS + DOCUMENTS)
+def test_parse_html_text_matches_html_parser(app, markup):
+    reference = app["html_root"](app["parse_html"](markup, parser="html.parser")).get_text()
+    fast = app["html_root"](app["parse_html"](markup, parser="lxml")).get_text()
+    assert app["normalize_text"](fast) == app["normalize_text"](reference)
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_highlighting_matches_html_parser(app, document):
+    quotes_list = app["load_quotes"](QUOTES, {})
+    results = []
+    for parser in ("html.parser", "lxml"):
+        soup = app["parse_html"](document, parser=parser)
+        unmatched = app["highlight_dialogue_in_soup"](soup, quotes_list)
+        results.append((app["serialize_html"](soup), unmatched))
+    assert results[0] == results[1]
@@ -0,0 +1,64 @@
+"""Quote record schema: versioned fast path, load-time validation and compact round trip."""
+import copy
+import json
+
+import pytest
+
+from conftest import load_app
+
+
+@pytest.fixture(scope="module")
+def app():
+    return load_app("streamlit_dialogue_test.py")
+
+
+@pytest.fixture
+def records(app):
+    lines = [
+        "1. Alice: “Hello there,” she said.",
+        "2. Unknown: “Who is it?”",
+        "3a. Bob: “It’s me.”",
+    ]
+    return [app["normalize_record_schema"](app["parse_quote_line"](line) | {"index": i + 1}, i + 1, trust_version=False)
+            for i, line in enumerate(lines)]
+
+
+def test_current_records_keep_collection_type_guards(app, records):
+    record = records[0]
+    record["candidate_speakers"] = "Alice"
+    record["candidate_scores"] = None
+    assert app["normalize_record_schema"](record, 1) is record
+    assert record["candidate_speakers"] == []
+    assert record["candidate_scores"] == {}
+
+
+def test_load_time_validation_ignores_the_version_stamp(app):
+    hand_edited = {
+        "schema_version": app["QUOTE_RECORD_SCHEMA_VERSION"],
+        "index": 4,
+        "speaker_text": "Carol",
+        "quote_text": "Fine.",
+        "candidate_speakers": {"Carol": 1},
+        "paragraph_index": "12",
+        "manual_override": "yes",
+        "context_current_html": "<p>stale</p>",
+    }
+    [record] = app["migrate_legacy_state_to_quotes_records"]({"quotes_records": [hand_edited]})
+    assert set(app["QUOTE_RECORD_FIELD_TYPES"]) <= set(record)
+    for key, types in app["QUOTE_RECORD_FIELD_TYPES"].items():
+        assert isinstance(record[key], types), key
+    assert record["candidate_speakers"] == []
+    assert record["paragraph_index"] is None
+    assert record["manual_override"] is False
+    assert "context_current_html" not in record
+    assert (record["index"], record["index_raw"], record["quote_id"]) == (4, "4", "q00004")
+
+
+def test_compact_records_round_trip_through_the_progress_file(app, records):
+    records[1].update(review_status="accepted", paragraph_index=7, occurrence_target=1, paragraph_match_occurrence=1)
+    records[2]["notes"] = "check spelling"
+    original = copy.deepcopy(records)
+    saved = json.loads(json.dumps([app["compact_quote_record"](r) for r in records]))
+    assert "candidate_scores" not in saved[0] and "review_status" not in saved[0]
+    assert saved[1]["review_status"] == "accepted"
+    assert app["migrate_legacy_state_to_quotes_records"]({"quotes_records": saved}) == original